@@ -1,13 +1,1842 @@
+import time
+
+_STARTUP_T0 = time.perf_counter()  # Reference point for --profile-startup
+
 import tkinter as tk
 from tkinter import filedialog, colorchooser, ttk, messagebox
 from PIL import Image, ImageTk, ImageDraw
+import argparse
+import ast
+import atexit
+import functools
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
 import os
 import pickle
+import queue
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import uuid
+import zipfile
+import zlib
 from tkinterdnd2 import TkinterDnD, DND_FILES
 
+
+def lazy_import(name):
+    """Import a module on first attribute access instead of at startup."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# NumPy is only needed once an image is edited or combined, so it stays out of the
+# startup path; module-level code must not touch np
+np = lazy_import("numpy")
+
+# Startup phases as (name, perf_counter()) for --profile-startup
+STARTUP_BUDGET_MS = 500
+_startup_marks = [("imports", time.perf_counter())]
+
+
+def mark_startup(phase):
+    _startup_marks.append((phase, time.perf_counter()))
+
+
+def startup_report():
+    """Per-phase startup timings as text lines, ending with the total against the budget."""
+    lines = []
+    previous = _STARTUP_T0
+    for phase, when in _startup_marks:
+        lines.append(f"{phase:<14}{(when - previous) * 1000:8.1f} ms")
+        previous = when
+    total = (previous - _STARTUP_T0) * 1000
+    verdict = "within" if total <= STARTUP_BUDGET_MS else "OVER"
+    lines.append(f"{'total':<14}{total:8.1f} ms ({verdict} the {STARTUP_BUDGET_MS} ms budget)")
+    return lines, total <= STARTUP_BUDGET_MS
+
 # Default paths
-INSTALL_DIR = os.path.join(os.getenv("PROGRAMFILES"), "MinecraftTextureEditor")
+INSTALL_DIR = os.path.join(os.getenv("PROGRAMFILES", os.path.expanduser("~")), "MinecraftTextureEditor")
 TEXTURES_DIR = os.path.join(INSTALL_DIR, "Textures")
+JOURNAL_DIR = os.path.join(INSTALL_DIR, "journal")  # Edit journals of open documents, replayed after a crash
+VANILLA_INDEX_FILE = os.path.join(INSTALL_DIR, "vanilla_index.pkl")  # Cached pixel hashes of vanilla texture zips
+HASH_INDEX_FILE = os.path.join(INSTALL_DIR, "hash_index.pkl")  # Perceptual hashes of every known texture
+
+# Combine patterns are small formulas over the output grid. Available names:
+# x, y (pixel coordinates), w, h (output size), n (image count), cx, cy (center)
+# and s (half the shorter side). A formula may start with "name = expr;" bindings
+# and ends with an expression giving the source image index of every pixel, so a
+# comparison picks Image 2 where it is true. Binding sx / sy changes which pixel
+# of the chosen image is read (it defaults to the same x, y).
+TWO_IMAGE_PATTERNS = {
+    "Horizontal Split": "x >= w // 2",
+    "Horizontal Split (Reverse)": "x < w // 2",
+    "Vertical Split": "y >= h // 2",
+    "Vertical Split (Reverse)": "y < h // 2",
+    "Checkerboard": "(x >= w // 2) ^ (y >= h // 2)",
+    "Checkerboard (Reverse)": "(x >= w // 2) == (y >= h // 2)",
+    "Per Bend": "y < (h * x) // w",
+    "Per Bend (Reverse)": "y < (h * (w - 1 - x)) // w",
+    "Cross": "t = max(1, w // 5) / 2; (abs(x - cx) > t) & (abs(y - cy) > t)",
+    "Cross (Reverse)": "t = max(1, w // 5) / 2; (abs(x - cx) <= t) | (abs(y - cy) <= t)",
+    "Chevron": "y >= (h * x) // w",
+    "Chevron (Reverse)": "y >= (h * (w - 1 - x)) // w",
+    "Inverted Chevron": "y <= (h * x) // w",
+    "Inverted Chevron (Reverse)": "y <= (h * (w - 1 - x)) // w",
+    "Stripes Horizontal": "(y // max(1, h // 4)) % 2",
+    "Stripes Vertical": "(x // max(1, w // 4)) % 2",
+    "Border": "b = max(1, w // 8); (x >= b) & (x < w - b) & (y >= b) & (y < h - b)",
+    "Border (Reverse)": "b = max(1, w // 8); (x < b) | (x >= w - b) | (y < b) | (y >= h - b)",
+    "Diamond": "abs(x - cx) + abs(y - cy) >= s",
+    "Diamond (Reverse)": "abs(x - cx) + abs(y - cy) < s",
+}
+
+# Patterns for 3+ images; "{n}" in the name is replaced by the image count
+MULTI_IMAGE_PATTERNS = {
+    "Split {n} Horizontal": "band(x, w, n)",
+    "Split {n} Vertical": "band(y, h, n)",
+    "Checkerboard {n}": (
+        "rows = int(n ** 0.5); cols = (n + rows - 1) // rows; "
+        "col = band(x, w, cols); row = band(y, h, rows); "
+        "sx = x - band_start(col, w, cols); sy = y - band_start(row, h, rows); "
+        "(row * cols + col) % n"
+    ),
+    "Stripes Horizontal {n}": "(y // max(1, h // n)) % n",
+    "Stripes Vertical {n}": "(x // max(1, w // n)) % n",
+    "Gradient {n}": "minimum(y * n // h, n - 1)",
+    "Border Cycle {n}": "(minimum(minimum(x, y), minimum(w - 1 - x, h - 1 - y)) // max(1, w // 8)) % n",
+    "Diamond Cycle {n}": "floor((abs(x - cx) + abs(y - cy)) * n / s) % n",
+}
+
+
+def _band(v, size, count):
+    # Index of the band holding v when size is split into count near-equal bands
+    # (the first size % count bands are one pixel wider)
+    q, r = divmod(size, count)
+    wide = r * (q + 1)
+    return np.where(v < wide, v // (q + 1), r + (v - wide) // max(q, 1))
+
+
+def _band_start(i, size, count):
+    q, r = divmod(size, count)
+    return i * q + np.minimum(i, r)
+
+
+@functools.lru_cache(maxsize=None)
+def _pattern_functions():
+    return {
+        "abs": np.abs, "floor": np.floor, "sqrt": np.sqrt, "where": np.where, "clip": np.clip,
+        "minimum": np.minimum, "maximum": np.maximum, "min": min, "max": max, "int": int,
+        "band": _band, "band_start": _band_start,
+    }
+
+
+_PATTERN_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.Name, ast.Load, ast.Store, ast.Constant,
+    ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.operator, ast.cmpop,
+    ast.UAdd, ast.USub, ast.Invert,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_pattern(formula):
+    """Validate a pattern formula and compile it to (bindings, expression) code objects."""
+    try:
+        tree = ast.parse(formula.strip(), mode="exec")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid pattern formula: {e.msg}")
+    if not tree.body or not isinstance(tree.body[-1], ast.Expr):
+        raise ValueError("Pattern formula must end with an expression.")
+    for statement in tree.body[:-1]:
+        if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Name)):
+            raise ValueError("Only 'name = expression' bindings may precede the pattern expression.")
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.BoolOp, ast.Not)):
+            raise ValueError("Use & | ~ instead of and / or / not in pattern formulas.")
+        if not isinstance(node, _PATTERN_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in pattern formulas.")
+        if isinstance(node, ast.Compare) and len(node.ops) > 1:
+            raise ValueError("Chained comparisons are not supported; combine them with &.")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in _pattern_functions()):
+            raise ValueError(f"Unknown function in pattern formula: {ast.unparse(node.func)}")
+    bindings = compile(ast.Module(body=tree.body[:-1], type_ignores=[]), "<pattern>", "exec")
+    expression = compile(ast.Expression(body=tree.body[-1].value), "<pattern>", "eval")
+    return bindings, expression
+
+
+@functools.lru_cache(maxsize=64)
+def pattern_geometry(formula, width, height, count):
+    """Evaluate a pattern once for a size and return read-only (index, sy, sx) gather arrays."""
+    bindings, expression = compile_pattern(formula)
+    y, x = np.mgrid[0:height, 0:width]
+    scope = dict(_pattern_functions(), __builtins__={}, x=x, y=y, w=width, h=height, n=count,
+                 cx=(width - 1) / 2, cy=(height - 1) / 2, s=min(width, height) / 2)
+    try:
+        exec(bindings, scope)
+        index = eval(expression, scope)
+    except NameError as e:
+        raise ValueError(f"Unknown name in pattern formula: {e.name}")
+    shape = (height, width)
+    index = np.broadcast_to(np.asarray(index), shape).astype(np.intp) % count
+    sx = np.clip(np.broadcast_to(scope.get("sx", x), shape).astype(np.intp), 0, width - 1)
+    sy = np.clip(np.broadcast_to(scope.get("sy", y), shape).astype(np.intp), 0, height - 1)
+    for array in (index, sy, sx):
+        array.setflags(write=False)
+    return index, sy, sx
+
+
+def builtin_patterns(count):
+    """Ordered {name: formula} of the built-in patterns for count images."""
+    if count == 2:
+        return dict(TWO_IMAGE_PATTERNS)
+    return {name.format(n=count): formula for name, formula in MULTI_IMAGE_PATTERNS.items()}
+
+
+def combine_pattern(images, formula, size):
+    """Resize images to size (nearest neighbour) and combine them with a pattern formula."""
+    width, height = size
+    stack = np.stack([np.asarray(image.convert("RGBA").resize(size, Image.NEAREST)) for image in images])
+    index, sy, sx = pattern_geometry(formula, width, height, len(images))
+    return Image.fromarray(stack[index, sy, sx], "RGBA")
+
+# Editor tools in sidebar order: (tool, button label)
+TOOLS = (
+    ("paint", "Paint"),
+    ("erase", "Erase"),
+    ("eyedropper", "Eyedropper"),
+    ("bucket", "Paint Bucket"),
+    ("select", "Select Rectangle"),
+    ("wand", "Magic Wand"),
+    ("move", "Move Selection"),
+)
+SELECTION_TOOLS = ("select", "wand", "move")
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+LOAD_POLL_MS = 30  # How often the Tk thread checks for images decoded in the background
+
+WATCH_INTERVAL_MS = 2000  # Pause between scans for textures edited outside the editor
+
+JOURNAL_COMPACT_RECORDS = 200  # Journal records after which a document's journal is rewritten as one snapshot
+
+DOCUMENT_MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes of open documents kept in memory; the rest are spilled to disk
+
+FRAME_INTERVAL_MS = 16  # Minimum time between coalesced canvas redraws (~60 fps)
+TICK_MS = 50  # One game tick, the unit of .mcmeta frame times
+ANIMATION_CACHE_FRAMES = 64  # Zoomed frame images kept for animation playback
+RENDER_TILE_SIZE = 256  # Canvas pixels per side of each PhotoImage the editor canvas is drawn with
+
+# Brush engine: stamps are precomputed boolean masks, dithers threshold a 4x4 Bayer
+# matrix tiled in image coordinates so neighbouring stamps line up
+BRUSH_SHAPES = ("Square", "Circle")
+BRUSH_MODES = ("Replace", "Blend")
+BRUSH_DITHERS = {"Solid": 16, "Dither 75%": 12, "Dither 50%": 8, "Dither 25%": 4}
+_BAYER_4 = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+
+
+@functools.lru_cache(maxsize=128)
+def brush_mask(shape, size):
+    """Read-only boolean stamp of a brush, centred on pixel (size // 2, size // 2)."""
+    if shape == "Circle":
+        yy, xx = np.mgrid[0:size, 0:size]
+        center = (size - 1) / 2
+        mask = (xx - center) ** 2 + (yy - center) ** 2 <= max((size / 2) ** 2 - 0.5, 0)
+    else:
+        mask = np.ones((size, size), dtype=bool)
+    mask.setflags(write=False)
+    return mask
+
+
+def stamp_segment(start, end, mask):
+    """Stamp mask at every pixel of the line start-end.
+
+    Returns (left, top, footprint): the union of the stamps as a boolean array whose
+    top-left corner sits at (left, top) in image coordinates.
+    """
+    (x0, y0), (x1, y1) = start, end
+    steps = max(abs(x1 - x0), abs(y1 - y0)) + 1
+    xs = np.rint(np.linspace(x0, x1, steps)).astype(np.intp)
+    ys = np.rint(np.linspace(y0, y1, steps)).astype(np.intp)
+    size_y, size_x = mask.shape
+    xs -= xs.min()
+    ys -= ys.min()
+    left = min(x0, x1) - size_x // 2
+    top = min(y0, y1) - size_y // 2
+    footprint = np.zeros((ys.max() + size_y, xs.max() + size_x), dtype=bool)
+    # Loop over whichever is smaller: the points of the line or the pixels of the brush
+    offsets = np.argwhere(mask)
+    if steps <= len(offsets):
+        for px, py in zip(xs, ys):
+            footprint[py:py + size_y, px:px + size_x] |= mask
+    else:
+        for dy, dx in offsets:
+            footprint[ys + dy, xs + dx] = True
+    return left, top, footprint
+
+
+def union_box(a, b):
+    """Smallest (left, top, right, bottom) box containing both boxes; either may be None."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def mask_bbox(mask):
+    """Bounding box (left, top, right, bottom) of the True pixels of mask, or None."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+
+
+def selection_from_mask(mask, origin=(0, 0)):
+    """Selection (box, mask cropped to box) of the True pixels of mask placed at origin, or None."""
+    box = mask_bbox(mask)
+    if box is None:
+        return None
+    left, top, right, bottom = box
+    return (left + origin[0], top + origin[1], right + origin[0], bottom + origin[1]), mask[top:bottom, left:right].copy()
+
+
+def magic_wand_mask(pixels, x, y):
+    """Mask of the 4-connected region of pixels exactly matching pixels[y, x]."""
+    same = np.all(pixels == pixels[y, x], axis=-1)
+    # frombytes gives floodfill a writable copy (fromarray images are read-only views)
+    region = Image.frombytes("L", (same.shape[1], same.shape[0]), same.astype(np.uint8).tobytes())
+    ImageDraw.floodfill(region, (x, y), 2)
+    return np.asarray(region) == 2
+
+
+def shift_hue(rgb, degrees):
+    """uint8 RGB pixels (..., 3) with their hue rotated by degrees.
+
+    Computed in floating point, so saturation and value are kept exactly and
+    grays are left alone.
+    """
+    c = rgb.astype(np.float64) / 255
+    value = c.max(axis=-1)
+    chroma = value - c.min(axis=-1)
+    r, g, b = c[..., 0], c[..., 1], c[..., 2]
+    safe = np.where(chroma == 0, 1, chroma)
+    hue = np.where(value == r, (g - b) / safe % 6, np.where(value == g, (b - r) / safe + 2, (r - g) / safe + 4))
+    hue = (hue + degrees / 60) % 6
+    # HSV -> RGB: each channel is value minus the part of chroma its sector takes away
+    k = (np.array([5, 3, 1]) + hue[..., None]) % 6
+    out = value[..., None] - chroma[..., None] * np.clip(np.minimum(k, 4 - k), 0, 1)
+    return np.rint(out * 255).astype(np.uint8)
+
+
+def blend_over(pixels, color):
+    """Alpha-composite an RGBA color over an (N, 4) uint8 pixel array."""
+    src = np.asarray(color, dtype=np.float64) / 255
+    dst = pixels.astype(np.float64) / 255
+    alpha = src[3] + dst[:, 3] * (1 - src[3])
+    rgb = (src[:3] * src[3] + dst[:, :3] * dst[:, 3:] * (1 - src[3])) / np.maximum(alpha, 1e-12)[:, None]
+    return np.rint(np.column_stack([rgb, alpha]) * 255).astype(np.uint8)
+
+
+LARGE_CANVAS_PIXELS = 4096 * 4096  # Canvases this big or bigger live in a memory-mapped file
+STORE_TILE_SIZE = 256  # Side of the tiles large canvases are tracked, saved for history and journaled in
+
+
+def tile_range(box, size=STORE_TILE_SIZE):
+    """(column, row) of every size x size tile overlapping box."""
+    left, top, right, bottom = box
+    for row in range(max(top, 0) // size, (bottom - 1) // size + 1):
+        for column in range(max(left, 0) // size, (right - 1) // size + 1):
+            yield column, row
+
+
+class PixelBuffer:
+    """The editor's working image: RGBA pixels in one contiguous (height, width, 4) uint8 array.
+
+    Tools write straight into pixels (or through paste) and report what they
+    changed with mark_dirty; the canvas redraws only those boxes. PIL images
+    are only made at the edges, by from_image and to_image.
+
+    Large canvases are backed by a memory-mapped temporary file, so only the
+    tiles that are touched or shown are ever paged into RAM. Strokes save the
+    tiles they are about to change with capture() instead of copying the image.
+    """
+
+    def __init__(self, pixels, mapped=False):
+        self.pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        self.mapped = mapped  # pixels live in a memory-mapped file
+        self.dirty = []  # Boxes (left, top, right, bottom) changed since the last redraw
+        self.written = set()  # Tiles of a mapped buffer that may no longer be blank
+        self.captured = None  # Tiles as they were at begin_capture(), saved on first write
+
+    @classmethod
+    def blank(cls, width, height):
+        if width * height < LARGE_CANVAS_PIXELS:
+            return cls(np.zeros((height, width, 4), dtype=np.uint8))
+        # Only pages that are touched are read into RAM; the file itself may be
+        # fully allocated on disk (NTFS zero-fills it when the last byte is written)
+        pixels = np.memmap(tempfile.TemporaryFile(), dtype=np.uint8, mode="w+", shape=(height, width, 4))
+        return cls(pixels, mapped=True)
+
+    @classmethod
+    def from_image(cls, image):
+        image = image.convert("RGBA")
+        if image.width * image.height < LARGE_CANVAS_PIXELS:
+            return cls(np.array(image))
+        buffer = cls.blank(image.width, image.height)
+        for top in range(0, image.height, STORE_TILE_SIZE):
+            strip = image.crop((0, top, image.width, min(top + STORE_TILE_SIZE, image.height)))
+            buffer.paste(np.asarray(strip), (0, top))
+        buffer.take_dirty()
+        return buffer
+
+    def to_image(self):
+        return Image.fromarray(self.pixels.copy(), "RGBA")
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def tile_box(self, tile):
+        column, row = tile
+        return (column * STORE_TILE_SIZE, row * STORE_TILE_SIZE,
+                min((column + 1) * STORE_TILE_SIZE, self.width), min((row + 1) * STORE_TILE_SIZE, self.height))
+
+    def crop(self, box):
+        left, top, right, bottom = box
+        return self.pixels[top:bottom, left:right].copy()
+
+    def paste(self, region, position):
+        if isinstance(region, TiledPixels):
+            region.paste_into(self, position)
+            return
+        left, top = position
+        self.pixels[top:top + region.shape[0], left:left + region.shape[1]] = region
+        self.mark_dirty((left, top, left + region.shape[1], top + region.shape[0]))
+
+    def mark_dirty(self, box):
+        self.dirty.append(box)
+        if self.mapped:
+            self.written.update(tile_range(box))
+
+    def take_dirty(self):
+        dirty, self.dirty = self.dirty, []
+        return dirty
+
+    def snapshot(self, box):
+        """Copy of box for history; for mapped buffers a TiledPixels of only the tiles ever written, the rest being blank."""
+        if not self.mapped:
+            return self.crop(box)
+        left, top, right, bottom = box
+        tiles = {}
+        for tile in self.written:
+            tile_left, tile_top, tile_right, tile_bottom = self.tile_box(tile)
+            x0, y0, x1, y1 = max(left, tile_left), max(top, tile_top), min(right, tile_right), min(bottom, tile_bottom)
+            if x0 < x1 and y0 < y1:
+                tiles[x0, y0] = self.pixels[y0:y1, x0:x1].copy()
+        return TiledPixels(box, tiles)
+
+    def begin_capture(self):
+        self.captured = {}
+
+    def capture(self, box):
+        # Call before writing into box: keeps the first copy of each tile under it
+        if self.captured is None:
+            return
+        for tile in tile_range(box):
+            if tile not in self.captured:
+                self.captured[tile] = self.crop(self.tile_box(tile))
+
+    def end_capture(self, box):
+        """Pixels of box as they were at begin_capture(); unchanged tiles are read from the buffer."""
+        before = self.crop(box)
+        left, top, right, bottom = box
+        for tile, saved in self.captured.items():
+            tile_left, tile_top, tile_right, tile_bottom = self.tile_box(tile)
+            x0, y0 = max(left, tile_left), max(top, tile_top)
+            x1, y1 = min(right, tile_right), min(bottom, tile_bottom)
+            if x0 < x1 and y0 < y1:
+                before[y0 - top:y1 - top, x0 - left:x1 - left] = saved[y0 - tile_top:y1 - tile_top, x0 - tile_left:x1 - tile_left]
+        self.captured = None
+        return before
+
+
+class TiledPixels:
+    """History pixels of a large box: a fill color plus the pieces of it that differ.
+
+    tiles maps the image position of each piece's top-left corner to its
+    pixels; everything else in box is fill. Used where a plain copy of the box
+    would hold a whole memory-mapped canvas in RAM.
+    """
+
+    def __init__(self, box, tiles, fill=(0, 0, 0, 0)):
+        self.box = box
+        self.tiles = tiles
+        self.fill = tuple(fill)
+
+    @property
+    def shape(self):
+        left, top, right, bottom = self.box
+        return bottom - top, right - left, 4
+
+    @property
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    def paste_into(self, buffer, position):
+        # position is where box's top-left corner goes, as for PixelBuffer.paste
+        left, top, right, bottom = self.box
+        dx, dy = position[0] - left, position[1] - top
+        buffer.pixels[top + dy:bottom + dy, left + dx:right + dx] = self.fill
+        for (x, y), tile in self.tiles.items():
+            buffer.pixels[y + dy:y + dy + tile.shape[0], x + dx:x + dx + tile.shape[1]] = tile
+        buffer.mark_dirty((left + dx, top + dy, right + dx, bottom + dy))
+
+
+def claim_pixels(claimed, box, footprint):
+    """Clear the pixels of footprint (covering box) already in claimed and add the rest to it.
+
+    claimed maps STORE_TILE_SIZE tiles to boolean masks, allocated only for
+    the tiles footprints touch.
+    """
+    left, top, right, bottom = box
+    for tile in tile_range(box):
+        tile_left, tile_top = tile[0] * STORE_TILE_SIZE, tile[1] * STORE_TILE_SIZE
+        if tile not in claimed:
+            claimed[tile] = np.zeros((STORE_TILE_SIZE, STORE_TILE_SIZE), dtype=bool)
+        x0, y0 = max(left, tile_left), max(top, tile_top)
+        x1, y1 = min(right, tile_left + STORE_TILE_SIZE), min(bottom, tile_top + STORE_TILE_SIZE)
+        part = footprint[y0 - top:y1 - top, x0 - left:x1 - left]
+        mask = claimed[tile][y0 - tile_top:y1 - tile_top, x0 - tile_left:x1 - tile_left]
+        part &= ~mask
+        mask |= part
+
+
+def pack_buffer(buffer):
+    """Picklable form of a PixelBuffer; mapped buffers keep only the tiles ever written."""
+    if not buffer.mapped:
+        return pack_pixels(buffer.pixels)
+    return "tiles", buffer.size, {tile: pack_pixels(buffer.crop(buffer.tile_box(tile))) for tile in buffer.written}
+
+
+def unpack_buffer(packed):
+    if packed[0] != "tiles":
+        return PixelBuffer(unpack_pixels(packed))
+    _, (width, height), tiles = packed
+    buffer = PixelBuffer.blank(width, height)
+    for (column, row), tile in tiles.items():
+        buffer.paste(unpack_pixels(tile), (column * STORE_TILE_SIZE, row * STORE_TILE_SIZE))
+    buffer.take_dirty()
+    return buffer
+
+
+def read_animation(texture_path, width, height):
+    """Frame layout of an animated texture from its .png.mcmeta, or None if it isn't one.
+
+    Returns a dict with frame_height, frame_count, frames (a list of
+    (frame index, ticks) in playback order) and interpolate.
+    """
+    try:
+        with open(texture_path + ".mcmeta", encoding="utf-8") as f:
+            animation = json.load(f).get("animation")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Error reading {texture_path}.mcmeta: {str(e)}")
+        return None
+    if not isinstance(animation, dict):
+        return None
+    # Frames are stacked vertically and square unless width/height say otherwise
+    frame_width = animation.get("width", width)
+    frame_height = animation.get("height", frame_width)
+    if frame_width != width or frame_height <= 0 or height // frame_height < 2:
+        return None
+    frame_count = height // frame_height
+    frametime = max(1, animation.get("frametime", 1))
+    frames = []
+    for frame in animation.get("frames", range(frame_count)):
+        if isinstance(frame, dict):
+            index, ticks = frame.get("index", 0), frame.get("time", frametime)
+        else:
+            index, ticks = frame, frametime
+        if 0 <= index < frame_count:
+            frames.append((index, max(1, ticks)))
+    return {"frame_height": frame_height, "frame_count": frame_count, "frames": frames or [(0, frametime)],
+            "interpolate": bool(animation.get("interpolate", False))}
+
+
+# Biome -> (temperature, downfall) as in the vanilla biome definitions, for colormap tinting
+BIOMES = {
+    "Plains": (0.8, 0.4),
+    "Forest": (0.7, 0.8),
+    "Birch Forest": (0.6, 0.6),
+    "Dark Forest": (0.7, 0.8),
+    "Swamp": (0.8, 0.9),
+    "Jungle": (0.95, 0.9),
+    "Taiga": (0.25, 0.8),
+    "Meadow": (0.5, 0.8),
+    "Ocean": (0.5, 0.5),
+    "Snowy Plains": (0.0, 0.5),
+    "Desert": (2.0, 0.0),
+    "Savanna": (2.0, 0.0),
+}
+COLORMAPS = ("Grass", "Foliage")
+TINT_CACHE_SIZE = 3  # Tinted copies of the image kept: the current tint and the most recently used others
+_colormaps = {}  # Colormaps found by find_colormap; misses aren't kept, so textures extracted later are picked up
+
+
+def find_colormap(name):
+    """Pixels of colormap/<name>.png from the newest extracted textures or bundled version zip, or None."""
+    if name not in _colormaps:
+        pixels = read_colormap(name)
+        if pixels is None:
+            return None
+        _colormaps[name] = pixels
+    return _colormaps[name]
+
+
+def read_colormap(name):
+    if os.path.exists(TEXTURES_DIR):
+        for version_dir in sorted(os.listdir(TEXTURES_DIR), reverse=True):
+            path = os.path.join(TEXTURES_DIR, version_dir, "colormap", name + ".png")
+            if os.path.exists(path):
+                return np.asarray(open_rgba(path))
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for zip_name in sorted((f for f in os.listdir(script_dir) if f.endswith(" Textures.zip")), reverse=True):
+        with zipfile.ZipFile(os.path.join(script_dir, zip_name)) as archive:
+            for entry in archive.namelist():
+                if entry.endswith(f"/colormap/{name}.png"):
+                    with Image.open(io.BytesIO(archive.read(entry))) as image:
+                        return np.asarray(image.convert("RGBA"))
+    return None
+
+
+def colormap_color(colormap, temperature, downfall):
+    """RGB the game samples from a 256x256 colormap for a biome's temperature and downfall."""
+    temperature = min(max(temperature, 0.0), 1.0)
+    downfall = min(max(downfall, 0.0), 1.0) * temperature
+    return colormap[int((1 - downfall) * 255), int((1 - temperature) * 255), :3]
+
+
+def tint_pixels(pixels, color):
+    """Copy of (h, w, 4) pixels with the RGB multiplied by color, as the game tints grass and leaves."""
+    tinted = pixels.copy()
+    tinted[..., :3] = pixels[..., :3].astype(np.uint16) * color.astype(np.uint16) // 255
+    return tinted
+
+
+TILING_PREVIEW_SIZE = 480  # Largest side of the tiling preview, in screen pixels
+SEAM_THRESHOLD = 32  # Largest channel difference across a wrap-around edge that still counts as seamless
+
+
+def edge_seams(pixels, threshold=SEAM_THRESHOLD):
+    """Where a texture doesn't continue across its wrap-around edges, as boolean masks (rows, columns).
+
+    rows[y] is set when the last pixel of row y differs from its first pixel
+    (the seam between copies side by side), columns[x] likewise for the last
+    and first pixel of column x.
+    """
+    rows = np.abs(pixels[:, -1].astype(np.int16) - pixels[:, 0]).max(axis=1) > threshold
+    columns = np.abs(pixels[-1].astype(np.int16) - pixels[0]).max(axis=1) > threshold
+    return rows, columns
+
+
+def update_edge_seams(seams, pixels, box, threshold=SEAM_THRESHOLD):
+    """Bring edge_seams() masks up to date after box changed; returns whether box touched an edge."""
+    rows, columns = seams
+    left, top, right, bottom = box
+    height, width = pixels.shape[:2]
+    touched = False
+    if left == 0 or right == width:
+        rows[top:bottom] = np.abs(pixels[top:bottom, -1].astype(np.int16) - pixels[top:bottom, 0]).max(axis=1) > threshold
+        touched = True
+    if top == 0 or bottom == height:
+        columns[left:right] = np.abs(pixels[-1, left:right].astype(np.int16) - pixels[0, left:right]).max(axis=1) > threshold
+        touched = True
+    return touched
+
+
+def mask_runs(mask):
+    """(start, end) of every run of True in a 1-D boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+MIPMAP_LEVELS = 4  # Mipmap levels the game generates at most ("Mipmap Levels" video setting)
+MIPMAP_PREVIEW_SIZE = 128  # Side every mipmap level is shown at
+
+
+@functools.lru_cache(maxsize=None)
+def gamma_table():
+    # Channel value -> linear light, the game's POW22 table
+    return np.power(np.arange(256, dtype=np.float32) / 255, 2.2)
+
+
+def mip_level(pixels, transparent):
+    """Next mipmap level of (h, w, 4) pixels with even sides, as the game's MipmapGenerator builds it.
+
+    Each 2x2 block is averaged in linear light. For textures with fully
+    transparent pixels (transparent=True) those add nothing to the average
+    and the result is cut out below alpha 96.
+    """
+    height, width = pixels.shape[0] // 2, pixels.shape[1] // 2
+    blocks = gamma_table()[pixels].reshape(height, 2, width, 2, 4)
+    if transparent:
+        blocks = blocks * (pixels[..., 3] != 0).reshape(height, 2, width, 2, 1)
+    level = (np.power(blocks.sum(axis=(1, 3)) / 4, 1 / 2.2) * 255).astype(np.uint8)
+    if transparent:
+        level[..., 3][level[..., 3] < 96] = 0
+    return level
+
+
+def mip_chain(pixels, levels=MIPMAP_LEVELS, transparent=None):
+    """[pixels, level 1, ...] for up to levels mipmap levels, stopping at an odd side.
+
+    Like the game, cutout blending is used when some pixel has alpha 0;
+    semi-transparent pixels alone don't switch it on.
+    """
+    if transparent is None:
+        transparent = bool((pixels[..., 3] == 0).any())
+    chain = [pixels]
+    while len(chain) <= levels and chain[-1].shape[0] % 2 == 0 and chain[-1].shape[1] % 2 == 0:
+        chain.append(mip_level(chain[-1], transparent))
+    return chain
+
+
+def update_mip_chain(chain, box, transparent):
+    # Recompute the blocks of every level below the changed box of level 0
+    left, top, right, bottom = box
+    for level in range(1, len(chain)):
+        left, top, right, bottom = left // 2, top // 2, -(-right // 2), -(-bottom // 2)
+        chain[level][top:bottom, left:right] = mip_level(chain[level - 1][2 * top:2 * bottom, 2 * left:2 * right], transparent)
+
+
+PREVIEW_3D_SIZE = 256  # Side of the block / item preview, in screen pixels
+# Isometric projection of the x, y (up) and z axes onto the screen
+ISO_AXES = ((0.866, 0.5), (0.0, -1.0), (-0.866, 0.5))
+
+
+def iso_projection(corners, size, margin=8):
+    """Function mapping 3-D points to screen points, fitting the given corners into a size x size view."""
+    axes = np.array(ISO_AXES).T
+    projected = np.array(corners, float) @ axes.T
+    low, high = projected.min(axis=0), projected.max(axis=0)
+    scale = (size - 2 * margin) / (high - low).max()
+    offset = (size - (high - low) * scale) / 2 - low * scale
+    return lambda point: np.asarray(point, float) @ axes.T * scale + offset
+
+
+def face_texels(project, origin, u_axis, v_axis, width, height, size):
+    """Texel index (row * width + column, or -1) seen at every screen pixel of one flat quad.
+
+    The quad spans origin + u * u_axis + v * v_axis for u, v in [0, 1) in 3-D;
+    its screen-space affine map is inverted once and applied to every pixel
+    center.
+    """
+    screen_origin = project(origin)
+    basis = np.stack([project(np.add(origin, u_axis)) - screen_origin, project(np.add(origin, v_axis)) - screen_origin], axis=1)
+    ys, xs = np.mgrid[0:size, 0:size] + 0.5
+    u, v = np.tensordot(np.linalg.inv(basis), np.stack([xs - screen_origin[0], ys - screen_origin[1]]), axes=1)
+    inside = (u >= 0) & (u < 1) & (v >= 0) & (v < 1)
+    texels = (v * height).astype(np.int64).clip(0, height - 1) * width + (u * width).astype(np.int64).clip(0, width - 1)
+    return np.where(inside, texels, -1).astype(np.intp)
+
+
+@functools.lru_cache(maxsize=8)
+def cube_gather(width, height, size=PREVIEW_3D_SIZE):
+    """(texels, shade) gather maps drawing a texture on the three visible faces of an isometric cube.
+
+    shade is the light of every pixel in 256ths.
+    """
+    project = iso_projection(list(itertools.product((0, 1), repeat=3)), size)
+    texels = np.full((size, size), -1, np.intp)
+    shade = np.full((size, size), 256, np.uint16)
+    # Top, left (south) and right (east) faces, lit like the game's block shading
+    faces = (((0, 1, 0), (1, 0, 0), (0, 0, 1), 1.0),
+             ((0, 1, 1), (1, 0, 0), (0, -1, 0), 0.8),
+             ((1, 1, 1), (0, 0, -1), (0, -1, 0), 0.6))
+    for origin, u_axis, v_axis, light in faces:
+        face = face_texels(project, origin, u_axis, v_axis, width, height, size)
+        texels = np.where(face >= 0, face, texels)
+        shade[face >= 0] = int(light * 256)
+    return texels, shade
+
+
+@functools.lru_cache(maxsize=8)
+def item_gather(width, height, size=PREVIEW_3D_SIZE):
+    """(texels, shades) gather maps of an item sprite extruded one texel deep, front layer first.
+
+    texels has one map per depth layer; the frontmost opaque layer is shown
+    at each pixel, so the sides of the extrusion appear as darker edges.
+    """
+    depth = 1 / max(width, height)
+    project = iso_projection([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, depth)], size)
+    # Enough layers that neighbouring ones are at most a screen pixel apart
+    layers = max(2, int(np.ceil(np.abs(project((0, 0, depth)) - project((0, 0, 0))).max())) + 1)
+    texels = np.stack([face_texels(project, (0, 1, z), (1, 0, 0), (0, -1, 0), width, height, size)
+                       for z in np.linspace(depth, 0, layers)])
+    shades = np.array([256] + [179] * (layers - 1), np.uint16)  # In 256ths
+    return texels, shades
+
+
+def shaded_gather(pixels, texels, shade):
+    """Pixels at flat texel indices (transparent where the index is -1), RGB scaled by shade in 256ths."""
+    out = pixels.reshape(-1, 4)[np.maximum(texels, 0)]
+    out[..., :3] = (out[..., :3] * shade[..., None]) >> 8
+    out[texels < 0] = 0
+    return out
+
+
+def render_cube(pixels, size=PREVIEW_3D_SIZE):
+    texels, shade = cube_gather(pixels.shape[1], pixels.shape[0], size)
+    return shaded_gather(pixels, texels, shade)
+
+
+def render_item(pixels, size=PREVIEW_3D_SIZE):
+    texels, shades = item_gather(pixels.shape[1], pixels.shape[0], size)
+    # Only alpha is gathered for every layer; colors just for the frontmost opaque one
+    alpha = pixels[..., 3].reshape(-1)[np.maximum(texels, 0)]
+    alpha[texels < 0] = 0
+    front = (alpha > 0).argmax(axis=0)
+    return shaded_gather(pixels, np.take_along_axis(texels, front[None], axis=0)[0], shades[front])
+
+
+def pack_pixels(pixels):
+    """Compact picklable form of a pixel array: (shape, zlib-compressed bytes)."""
+    if isinstance(pixels, TiledPixels):
+        return "tiled", pixels.box, pixels.fill, {origin: pack_pixels(tile) for origin, tile in pixels.tiles.items()}
+    return pixels.shape, zlib.compress(np.ascontiguousarray(pixels).tobytes(), 1)
+
+
+def unpack_pixels(packed):
+    if packed[0] == "tiled":
+        _, box, fill, tiles = packed
+        return TiledPixels(box, {origin: unpack_pixels(tile) for origin, tile in tiles.items()}, fill)
+    shape, data = packed
+    return np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(shape).copy()
+
+
+def pack_history(stack):
+    return [(box, pack_pixels(before), pack_pixels(after)) for box, before, after in stack]
+
+
+def unpack_history(stack):
+    return [(box, unpack_pixels(before), unpack_pixels(after)) for box, before, after in stack]
+
+
+# Journal files are a sequence of records, each a pickled tuple prefixed by its
+# length and CRC32, so a record torn by a crash is detected and ignored. The
+# first record is a snapshot; the rest are edits, undos and redos since then.
+_JOURNAL_HEADER = struct.Struct("<II")
+
+
+def append_journal(path, *records):
+    """Append records to the journal at path and flush them to disk."""
+    data = b"".join(_JOURNAL_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+                    for payload in (pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL) for record in records))
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_journal_snapshot(path, name, source, image, undo_stack, redo_stack):
+    """Replace the journal at path with a single snapshot record (compaction)."""
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    append_journal(temp_path, ("snapshot", name, source, pack_buffer(image), pack_history(undo_stack), pack_history(redo_stack)))
+    os.replace(temp_path, path)
+
+
+def lock_file(path):
+    """Open path (creating it) with an exclusive lock; the open file, or None if another process holds the lock.
+
+    The lock lasts until the file is closed or the process exits, however it exits.
+    """
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def replay_journal(path):
+    """Rebuild a document dict (name, path, image, undo_stack, redo_stack) from a journal.
+
+    Replay stops at the first torn or corrupt record. Returns None if the
+    journal has no intact snapshot.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    document = None
+    offset = 0
+    while offset + _JOURNAL_HEADER.size <= len(data):
+        length, crc = _JOURNAL_HEADER.unpack_from(data, offset)
+        payload = data[offset + _JOURNAL_HEADER.size:offset + _JOURNAL_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        offset += _JOURNAL_HEADER.size + length
+        record = pickle.loads(payload)
+        if record[0] == "snapshot":
+            name, source, image, undo_stack, redo_stack = record[1:]
+            document = {"name": name, "path": source, "image": unpack_buffer(image),
+                        "undo_stack": unpack_history(undo_stack), "redo_stack": unpack_history(redo_stack)}
+        elif document is None:
+            break
+        elif record[0] == "edit":
+            box, before, after = record[1], unpack_pixels(record[2]), unpack_pixels(record[3])
+            document["image"].paste(after, box[:2])
+            document["undo_stack"].append((box, before, after))
+            document["redo_stack"] = []
+        elif record[0] == "undo" and document["undo_stack"]:
+            box, before, after = document["undo_stack"].pop()
+            document["redo_stack"].append((box, before, after))
+            document["image"].paste(before, box[:2])
+        elif record[0] == "redo" and document["redo_stack"]:
+            box, before, after = document["redo_stack"].pop()
+            document["undo_stack"].append((box, before, after))
+            document["image"].paste(after, box[:2])
+    return document
+
+
+def document_bytes(document):
+    """Memory held by an in-memory document: its pixels (unless mapped) plus history crops."""
+    total = 0 if document["image"].mapped else document["image"].pixels.nbytes
+    for box, before, after in document["undo_stack"] + document["redo_stack"]:
+        total += before.nbytes + after.nbytes
+    return total
+
+
+def history_arrays(stack):
+    """History entries as pixel arrays; projects saved before PixelBuffer hold PIL crops."""
+    as_array = lambda pixels: pixels if isinstance(pixels, TiledPixels) else np.array(pixels)
+    return [(box, as_array(before), as_array(after)) for box, before, after in stack]
+
+
+CONTACT_SHEET_LABEL_HEIGHT = 24  # Two lines of the default bitmap font under each cell
+
+
+def expand_texture_paths(paths):
+    """Expand files and directories (searched recursively) into a sorted list of PNG paths."""
+    textures = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                textures.extend(os.path.join(directory, name) for name in files if name.lower().endswith(".png"))
+        else:
+            textures.append(path)
+    return sorted(textures)
+
+
+def open_rgba(path):
+    """Open and fully decode an image file as RGBA."""
+    with Image.open(path) as image:
+        return image.convert("RGBA")
+
+
+def open_images(paths, workers=None):
+    """Decode several image files concurrently.
+
+    Returns a list parallel to paths holding an RGBA image, or the exception
+    raised while opening that file.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def load(path):
+        try:
+            return open_rgba(path)
+        except Exception as e:
+            return e
+
+    # Pillow releases the GIL while decoding, so threads are enough here
+    with ThreadPoolExecutor(max_workers=workers or min(8, len(paths) or 1)) as pool:
+        return list(pool.map(load, paths))
+
+
+@functools.lru_cache(maxsize=256)
+def _load_rgba(path):
+    return open_rgba(path)
+
+
+def render_contact_sheet(cells, output_path, size, scale, columns):
+    """Render (texture paths, pattern name, formula) cells into one labelled sheet PNG.
+
+    A .txt file with the full texture paths of every cell is written next to the sheet.
+    """
+    tile = size * scale
+    cell_width = max(tile, 96)
+    cell_height = tile + CONTACT_SHEET_LABEL_HEIGHT
+    max_chars = cell_width // 6
+    rows = (len(cells) + columns - 1) // columns
+    sheet = Image.new("RGBA", (columns * cell_width, rows * cell_height), (26, 26, 26, 255))
+    draw = ImageDraw.Draw(sheet)
+    lines = []
+    for i, (paths, name, formula) in enumerate(cells):
+        row, col = divmod(i, columns)
+        left, top = col * cell_width, row * cell_height
+        combined = combine_pattern([_load_rgba(path) for path in paths], formula, (size, size)).resize((tile, tile), Image.NEAREST)
+        sheet.paste(combined, (left + (cell_width - tile) // 2, top), combined)
+        per_stem = max(3, (max_chars - len(paths) + 1) // len(paths))
+        stems = "+".join(os.path.splitext(os.path.basename(path))[0][:per_stem] for path in paths)
+        draw.text((left + 2, top + tile + 1), name[:max_chars], fill="white")
+        draw.text((left + 2, top + tile + 12), stems[:max_chars], fill="gray")
+        lines.append(f"{row},{col}\t{name}\t{' + '.join(paths)}")
+    sheet.save(output_path)
+    with open(os.path.splitext(output_path)[0] + ".txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return output_path
+
+
+def generate_contact_sheets(textures, output_dir, count=2, patterns=None, size=16, scale=4, columns=16, rows=16, workers=None):
+    """Render every texture combination x pattern into contact sheets in output_dir.
+
+    patterns maps names to formulas and defaults to the built-in patterns for count
+    images. Combinations are generated lazily and each sheet is rendered by a worker
+    process, with at most two sheets per worker in flight, so memory stays bounded
+    however many combinations there are. Returns the written sheet paths.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    if len(textures) < count:
+        raise ValueError(f"Need at least {count} textures, got {len(textures)}.")
+    if patterns is None:
+        patterns = builtin_patterns(count)
+    for formula in patterns.values():
+        compile_pattern(formula)
+    workers = workers or os.cpu_count() or 1
+    per_sheet = columns * rows
+    cells = (
+        (combination, name, formula)
+        for combination in itertools.combinations(textures, count)
+        for name, formula in patterns.items()
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for number in itertools.count(1):
+            batch = list(itertools.islice(cells, per_sheet))
+            if not batch:
+                break
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    written.append(future.result())
+                    print(f"Wrote {written[-1]}")
+            output_path = os.path.join(output_dir, f"sheet_{number:04d}.png")
+            pending.add(pool.submit(render_contact_sheet, batch, output_path, size, scale, columns))
+        for future in pending:
+            written.append(future.result())
+            print(f"Wrote {written[-1]}")
+    return sorted(written)
+
+
+PNG_SEARCH_PIXELS = 64 * 64  # Images up to this size try every filter and zlib strategy
+PNG_LEVEL9_PIXELS = 256 * 256  # Larger images are deflated at level 6, level 9 gains little on them
+PNG_OPTIMIZABLE_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")  # Modes optimize_png re-encodes losslessly
+PNG_COLOR_CHUNKS = (b"gAMA", b"cHRM", b"iCCP", b"sRGB")  # Color management optimize_png would drop
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def png_rewritable(data):
+    """Whether optimize_png can rewrite PNG file contents without changing how they display.
+
+    Only PNGs of at most 8 bits per sample, in a mode from
+    PNG_OPTIMIZABLE_MODES and without color management chunks qualify.
+    """
+    if data[:8] != b"\x89PNG\r\n\x1a\n" or len(data) < 33 or data[24] > 8:
+        return False
+    position = 8
+    while position + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        if kind in PNG_COLOR_CHUNKS:
+            return False
+        if kind == b"IDAT":
+            # Color management chunks must come before the image data
+            break
+        position += 12 + length
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.mode in PNG_OPTIMIZABLE_MODES
+    except Exception:
+        return False
+
+
+def png_filter(rows, previous, bpp, filter_type=None):
+    """Scanlines (height, stride) filtered for PNG, each prefixed with its filter type byte.
+
+    previous is the scanline above the first row (zeros at the top of the
+    image). filter_type None picks the filter per row with the smallest sum
+    of absolute differences, like libpng's adaptive filtering.
+    """
+    x = rows.astype(np.int16)
+    up = np.empty_like(x)
+    up[0] = previous
+    up[1:] = x[:-1]
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up_left = np.zeros_like(x)
+    up_left[:, bpp:] = up[:, :-bpp]
+    # Paeth predictor
+    p = left + up - up_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    predictions = [0, left, up, (left + up) >> 1, paeth]
+    if filter_type is None:
+        filtered = np.stack([(x - prediction) & 0xFF for prediction in predictions]).astype(np.uint8)
+        signed = filtered.astype(np.int16)
+        cost = np.minimum(signed, 256 - signed).sum(axis=2)
+        types = cost.argmin(axis=0).astype(np.uint8)
+        filtered = filtered[types, np.arange(len(rows))]
+    else:
+        filtered = ((x - predictions[filter_type]) & 0xFF).astype(np.uint8)
+        types = np.full(len(rows), filter_type, np.uint8)
+    return np.concatenate([types[:, None], filtered], axis=1).tobytes()
+
+
+def png_idat(raw, bpp, filter_type, strategy, level=9, strip=256):
+    """Compressed image data of raw scanlines, filtered and deflated a strip of rows at a time."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+    previous = np.zeros(raw.shape[1], np.uint8)
+    parts = []
+    for top in range(0, len(raw), strip):
+        rows = raw[top:top + strip]
+        parts.append(compressor.compress(png_filter(rows, previous, bpp, filter_type)))
+        previous = rows[-1]
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def png_encodings(image):
+    """Lossless PNG encodings of an RGBA image as (IHDR fields, extra chunks, raw scanlines, bpp).
+
+    Always includes the smallest direct color type (L, LA, RGB or RGBA) and,
+    when the image has at most 256 colors, a palette with the transparent
+    entries first so tRNS stays short, packed to 1, 2 or 4 bits when it fits.
+    """
+    pixels = np.asarray(image)
+    height, width = pixels.shape[:2]
+    opaque = bool((pixels[..., 3] == 255).all())
+    gray = bool(((pixels[..., 0] == pixels[..., 1]) & (pixels[..., 1] == pixels[..., 2])).all())
+    channels = {(True, True): [0], (True, False): [0, 3], (False, True): [0, 1, 2], (False, False): [0, 1, 2, 3]}[gray, opaque]
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[len(channels)]
+    raw = pixels if len(channels) == 4 else np.ascontiguousarray(pixels[..., channels])
+    yield (width, height, 8, color_type), [], raw.reshape(height, -1), len(channels)
+
+    if len(channels) == 1 or width * height >= LARGE_CANVAS_PIXELS:
+        return
+    colors, indices = np.unique(pixels.reshape(-1, 4).view(np.uint32)[:, 0], return_inverse=True)
+    if len(colors) > 256:
+        return
+    palette = colors.view(np.uint8).reshape(-1, 4)
+    order = np.argsort(palette[:, 3] == 255, kind="stable")
+    palette = palette[order]
+    remap = np.empty(len(order), np.uint8)
+    remap[order] = np.arange(len(order))
+    indices = remap[indices].reshape(height, width)
+    depth = next(d for d in (1, 2, 4, 8) if len(colors) <= 1 << d)
+    if depth < 8:
+        per_byte = 8 // depth
+        padded = np.zeros((height, -(-width // per_byte) * per_byte), np.uint8)
+        padded[:, :width] = indices
+        groups = padded.reshape(height, -1, per_byte)
+        shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * depth
+        indices = np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+    chunks = [png_chunk(b"PLTE", palette[:, :3].tobytes())]
+    translucent = int((palette[:, 3] < 255).sum())
+    if translucent:
+        chunks.append(png_chunk(b"tRNS", palette[:translucent, 3].tobytes()))
+    yield (width, height, depth, 3), chunks, indices, 1
+
+
+def optimize_png(image):
+    """Smallest PNG bytes found for image that decode to exactly the same pixels.
+
+    image must be in one of PNG_OPTIMIZABLE_MODES. Every lossless color type
+    from png_encodings is tried; small images also try each filter and zlib
+    strategy, larger ones only adaptive filtering and no filtering, and the
+    largest a faster zlib level. The result is decoded and compared with
+    image in its own mode before it is returned, falling back to Pillow's
+    own encoder if anything differs.
+    """
+    if image.mode not in PNG_OPTIMIZABLE_MODES:
+        raise ValueError(f"Can't optimize {image.mode} images losslessly")
+    source = image
+    image = image.convert("RGBA")
+    thorough = image.width * image.height <= PNG_SEARCH_PIXELS
+    level = 9 if image.width * image.height <= PNG_LEVEL9_PIXELS else 6
+    filters = [None, 0, 1, 2, 3, 4] if thorough else [None, 0]
+    strategies = [zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED] if thorough else [zlib.Z_DEFAULT_STRATEGY]
+    best = None
+    for header, chunks, raw, bpp in png_encodings(image):
+        for filter_type, strategy in itertools.product(filters, strategies):
+            data = png_idat(raw, bpp, filter_type, strategy, level)
+            if best is None or len(data) + sum(map(len, chunks)) < len(best[2]) + sum(map(len, best[1])):
+                best = header, chunks, data
+    header, chunks, data = best
+    png = b"".join([b"\x89PNG\r\n\x1a\n", png_chunk(b"IHDR", struct.pack(">IIBBBBB", *header, 0, 0, 0)), *chunks,
+                    png_chunk(b"IDAT", data), png_chunk(b"IEND", b"")])
+    with Image.open(io.BytesIO(png)) as decoded:
+        # Palette images are compared by color, their indices may be renumbered
+        mode = "RGBA" if source.mode == "P" else source.mode
+        if decoded.convert(mode).tobytes() == source.convert(mode).tobytes():
+            return png
+    output = io.BytesIO()
+    source.save(output, "PNG", optimize=True)
+    return output.getvalue()
+
+
+def optimize_png_file(path, output_path=None):
+    """Rewrite a PNG (to output_path, or in place) if optimize_png makes it smaller.
+
+    PNGs png_rewritable rejects are kept as they are. Returns (path, old size,
+    new size).
+    """
+    with open(path, "rb") as f:
+        original = f.read()
+    data = original
+    if png_rewritable(original):
+        with Image.open(io.BytesIO(original)) as image:
+            optimized = optimize_png(image)
+        if len(optimized) < len(original):
+            data = optimized
+    output_path = output_path or path
+    if data is not original or output_path != path:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(output_path + ".tmp", output_path)
+    return path, len(original), len(data)
+
+
+def map_files(function, jobs, workers=None):
+    """Run function(*args) for every args tuple in jobs in worker processes, yielding results as they finish.
+
+    Jobs are submitted lazily with at most a few per worker in flight, so any
+    number of files can be processed in bounded memory.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for args in jobs:
+            if len(pending) >= 4 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+            pending.add(pool.submit(function, *args))
+        yield from (future.result() for future in pending)
+
+
+def mirrored_paths(paths, output_dir):
+    """(path, output path) pairs keeping each file's path relative to the inputs' common directory under output_dir.
+
+    Without output_dir the output path is None.
+    """
+    if not output_dir or not paths:
+        return [(path, None) for path in paths]
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [(path, os.path.join(output_dir, os.path.relpath(os.path.abspath(path), root))) for path in paths]
+
+
+def optimize_pngs(paths, output_dir=None, workers=None):
+    """Optimize many PNGs in worker processes, in place or into output_dir.
+
+    Returns the total (old size, new size) in bytes.
+    """
+    before = after = 0
+    for path, old_size, new_size in map_files(optimize_png_file, mirrored_paths(paths, output_dir), workers):
+        before += old_size
+        after += new_size
+        print(f"{path}: {old_size} -> {new_size} bytes")
+    return before, after
+
+
+def color_histogram(path):
+    """(colors, counts) of the visible pixels of a texture, colors as packed RGBA uint32."""
+    pixels = np.asarray(open_rgba(path)).reshape(-1, 4)
+    colors = pixels[pixels[:, 3] > 0].view(np.uint32)[:, 0]
+    return np.unique(colors, return_counts=True)
+
+
+def extract_palette(paths, workers=None):
+    """Combined palette of textures as [((r, g, b, a), pixel count)], most used first.
+
+    Each texture's histogram is computed by a worker process and the partial
+    histograms are merged as they arrive.
+    """
+    colors = np.zeros(0, np.uint32)
+    counts = np.zeros(0, np.int64)
+    for file_colors, file_counts in map_files(color_histogram, ((path,) for path in paths), workers):
+        colors, inverse = np.unique(np.concatenate([colors, file_colors]), return_inverse=True)
+        counts = np.bincount(inverse, np.concatenate([counts, file_counts]), len(colors)).astype(np.int64)
+    order = np.argsort(-counts, kind="stable")
+    rgba = colors[order].view(np.uint8).reshape(-1, 4)
+    return [(tuple(int(v) for v in color), int(count)) for color, count in zip(rgba, counts[order])]
+
+
+def color_to_hex(color):
+    return "#" + "".join(f"{v:02x}" for v in color)
+
+
+def hex_to_color(text):
+    """(r, g, b, a) of "#rrggbb" or "#rrggbbaa"."""
+    text = text.strip().lstrip("#")
+    if len(text) not in (6, 8):
+        raise ValueError(f"Invalid color: #{text}")
+    color = tuple(int(text[i:i + 2], 16) for i in range(0, len(text), 2))
+    return color + (255,) * (4 - len(color))
+
+
+def palette_lut(mapping):
+    """Sorted lookup table (keys, values) of packed RGBA colors for a {color: color} mapping."""
+    pairs = np.array([list(source) + list(target) for source, target in mapping.items()], np.uint8).reshape(-1, 8)
+    keys = np.ascontiguousarray(pairs[:, :4]).view(np.uint32)[:, 0]
+    values = np.ascontiguousarray(pairs[:, 4:]).view(np.uint32)[:, 0]
+    order = np.argsort(keys)
+    return keys[order], values[order]
+
+
+def apply_palette_lut(pixels, lut):
+    """(h, w, 4) pixels with every color found in the lookup table replaced."""
+    keys, values = lut
+    colors = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    if not len(keys):
+        return pixels.copy()
+    index = np.minimum(np.searchsorted(keys, colors), len(keys) - 1)
+    swapped = np.where(keys[index] == colors, values[index], colors)
+    return swapped[..., None].view(np.uint8)
+
+
+def swap_palette_file(lut, path, output_path=None):
+    """Write a texture recolored through lut (to output_path, or in place); returns (path, pixels changed)."""
+    pixels = np.asarray(open_rgba(path))
+    swapped = apply_palette_lut(pixels, lut)
+    changed = int((swapped != pixels).any(axis=2).sum())
+    output_path = output_path or path
+    if changed or output_path != path:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(output_path + ".tmp", "wb") as f:
+            f.write(optimize_png(Image.fromarray(swapped, "RGBA")))
+        os.replace(output_path + ".tmp", output_path)
+    return path, changed
+
+
+def swap_palettes(paths, mapping, output_dir=None, workers=None):
+    """Recolor textures through a {color: color} mapping in worker processes, in place or into output_dir.
+
+    Every file is written as soon as its worker finishes. Returns the number
+    of files that had colors replaced.
+    """
+    swap = functools.partial(swap_palette_file, palette_lut(mapping))
+    recolored = 0
+    for path, changed in map_files(swap, mirrored_paths(paths, output_dir), workers):
+        recolored += bool(changed)
+        print(f"{path}: {changed} pixels recolored")
+    return recolored
+
+
+PACK_FORMAT = 55  # Resource pack format of Minecraft 1.21.5
+PACK_TEXTURES = "assets/minecraft/textures/"
+
+
+def pack_texture_path(path):
+    """Path of a texture inside a resource pack, e.g. assets/minecraft/textures/block/stone.png.
+
+    The part after a "textures" or "<version> Textures" directory is kept; a
+    file anywhere else keeps its parent directory as the category, and a bare
+    name goes under block/.
+    """
+    parts = [part for part in path.replace("\\", "/").split("/") if part]
+    for i in range(len(parts) - 2, -1, -1):
+        if parts[i] == "textures" or parts[i].endswith(" Textures"):
+            parts = parts[i + 1:]
+            break
+    else:
+        parts = parts[-2:] if len(parts) > 1 else ["block"] + parts
+    if not parts[-1].lower().endswith(".png"):
+        parts[-1] += ".png"
+    return PACK_TEXTURES + "/".join(parts)
+
+
+def pixel_digest(image):
+    """Hash of an image's size and RGBA pixels; equal for identical textures however they were encoded."""
+    image = image.convert("RGBA")
+    digest = hashlib.blake2b(struct.pack("<II", *image.size), digest_size=16)
+    digest.update(image.tobytes())
+    return digest.digest()
+
+
+def png_digest(data):
+    return pixel_digest(Image.open(io.BytesIO(data)))
+
+
+def vanilla_index(zip_path, workers=None):
+    """{pack path: (CRC-32, pixel digest)} of every PNG in a vanilla texture zip such as "1.21.5 Textures.zip".
+
+    The CRC-32 of the file (free from the zip directory) lets unchanged copies
+    be skipped without decoding them; the pixel digest catches textures that
+    were saved again without changes. Indexes are cached in VANILLA_INDEX_FILE keyed by the zip's path, size and
+    modification time, so the archive is only decoded the first time.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    stat = os.stat(zip_path)
+    key = (os.path.abspath(zip_path), stat.st_size, stat.st_mtime_ns)
+    cache = {}
+    if os.path.exists(VANILLA_INDEX_FILE):
+        try:
+            with open(VANILLA_INDEX_FILE, "rb") as f:
+                cache = pickle.load(f)
+        except:
+            cache = {}
+    if key in cache:
+        return cache[key]
+
+    with zipfile.ZipFile(zip_path) as archive, ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        entries = [info for info in archive.infolist() if info.filename.lower().endswith(".png")]
+        digests = pool.map(png_digest, (archive.read(info) for info in entries), chunksize=64)
+        index = {pack_texture_path(info.filename): (info.CRC, digest) for info, digest in zip(entries, digests)}
+
+    # Only indexes of zips that still exist are kept
+    cache = {k: v for k, v in cache.items() if os.path.exists(k[0])}
+    cache[key] = index
+    os.makedirs(INSTALL_DIR, exist_ok=True)
+    with open(VANILLA_INDEX_FILE + ".tmp", "wb") as f:
+        pickle.dump(cache, f)
+    os.replace(VANILLA_INDEX_FILE + ".tmp", VANILLA_INDEX_FILE)
+    return index
+
+
+def encode_png(source, unchanged=None, transform=None):
+    """Optimized PNG bytes for a texture file path, PNG file contents or a packed (mode, size, pixel bytes) image.
+
+    Returns None instead when the source matches unchanged, a (CRC-32, pixel
+    digest) entry of a vanilla index. transform, if given, maps the RGBA image
+    before it is encoded. Untransformed PNG contents are kept as they are when
+    optimize_png can't make them smaller or png_rewritable rejects them.
+    """
+    original = None
+    if isinstance(source, (str, bytes)):
+        data = source
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                data = f.read()
+        if unchanged is not None and zlib.crc32(data) == unchanged[0]:
+            return None
+        opened = Image.open(io.BytesIO(data))
+        image = opened.convert("RGBA")
+        original = data
+    else:
+        mode, size, data = source
+        image = Image.frombytes(mode, size, data)
+    if unchanged is not None and pixel_digest(image) == unchanged[1]:
+        return None
+    if transform is not None:
+        return optimize_png(transform(image))
+    if original is None:
+        return optimize_png(image)
+    if not png_rewritable(original):
+        return original
+    optimized = optimize_png(opened)
+    return optimized if len(optimized) < len(original) else original
+
+
+def export_resource_pack(textures, output_path, description="Made with Minecraft Texture Editor", pack_format=PACK_FORMAT, workers=None, vanilla=None,
+                         transform=None, metadata=None, untransformed=()):
+    """Stream textures into a ready-to-use resource pack zip at output_path.
+
+    textures is an iterable of (pack path, source) pairs, where source is a PNG
+    file path, PNG file contents or a PIL image. PNGs are encoded by a pool of
+    worker processes, after the picklable transform if one is given, and
+    written into the zip as they finish, at most a few per worker in flight.
+    The .png.mcmeta next to a source file is copied along, or taken from
+    metadata ({pack path: .mcmeta contents}) for sources that are not files. The zip is written
+    beside output_path and moved into place when complete. With a vanilla index
+    (see vanilla_index) textures identical to vanilla are left out, so only
+    the changes are encoded and written. Textures whose pack path starts with
+    one of the untransformed prefixes are written without the transform.
+    Returns the number of textures written.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    workers = workers or os.cpu_count() or 1
+    partial_path = output_path + ".part"
+    written = 0
+
+    def store(archive, futures):
+        nonlocal written
+        for future in futures:
+            pack_path, source = pending.pop(future)
+            if future.result() is None:
+                continue
+            # PNG data is already deflated, so it is stored as is
+            archive.writestr(pack_path, future.result(), compress_type=zipfile.ZIP_STORED)
+            if isinstance(source, str) and os.path.exists(source + ".mcmeta"):
+                archive.write(source + ".mcmeta", pack_path + ".mcmeta")
+            elif metadata and pack_path in metadata:
+                archive.writestr(pack_path + ".mcmeta", metadata[pack_path])
+            written += 1
+
+    with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED) as archive, ProcessPoolExecutor(max_workers=workers) as pool:
+        archive.writestr("pack.mcmeta", json.dumps({"pack": {"pack_format": pack_format, "description": description}}, indent=2))
+        pending = {}
+        for pack_path, source in textures:
+            if len(pending) >= 4 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                store(archive, done)
+            unchanged = vanilla.get(pack_path) if vanilla else None
+            texture_transform = None if pack_path.startswith(tuple(untransformed)) else transform
+            if isinstance(source, Image.Image):
+                source = ("RGBA", source.size, source.convert("RGBA").tobytes())
+                pending[pool.submit(encode_png, source, unchanged, texture_transform)] = (pack_path, None)
+            else:
+                pending[pool.submit(encode_png, source, unchanged, texture_transform)] = (pack_path, source)
+        store(archive, list(pending))
+    os.replace(partial_path, output_path)
+    return written
+
+
+# Pixel-art upscalers: each maps an (h, w, 4) uint8 array to (2h, 2w, 4)
+
+def _neighbors(pixels, radius):
+    """Edge-padded copy of pixels and a function giving the view shifted by (dy, dx)."""
+    padded = np.pad(pixels, ((radius, radius), (radius, radius), (0, 0)), mode="edge")
+    height, width = pixels.shape[:2]
+    return lambda dy, dx: padded[radius + dy:radius + dy + height, radius + dx:radius + dx + width]
+
+
+def _interleave(top_left, top_right, bottom_left, bottom_right):
+    height, width = top_left.shape[:2]
+    out = np.empty((height, 2, width, 2) + top_left.shape[2:], top_left.dtype)
+    out[:, 0, :, 0], out[:, 0, :, 1], out[:, 1, :, 0], out[:, 1, :, 1] = top_left, top_right, bottom_left, bottom_right
+    return out.reshape((2 * height, 2 * width) + top_left.shape[2:])
+
+
+def scale_nearest2x(pixels):
+    return pixels.repeat(2, axis=0).repeat(2, axis=1)
+
+
+def scale_epx2x(pixels):
+    """Scale2x/EPX: a corner takes the color of its two neighbors when they match and no edge crosses it."""
+    colors = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    at = _neighbors(colors[..., None], 1)
+    b, d, e, f, h = at(-1, 0)[..., 0], at(0, -1)[..., 0], colors, at(0, 1)[..., 0], at(1, 0)[..., 0]
+    corner = (b != h) & (d != f)
+    out = _interleave(np.where(corner & (d == b), d, e), np.where(corner & (b == f), f, e),
+                      np.where(corner & (d == h), d, e), np.where(corner & (h == f), f, e))
+    return out[..., None].view(np.uint8)
+
+
+def _xbr_bottom_right(pixels):
+    """New bottom-right quarter of every pixel for 2xBR (Hyllian's xBR level 1)."""
+    yuv = pixels.astype(np.float32) @ np.array([[0.299, -0.169, 0.5, 0], [0.587, -0.331, -0.419, 0],
+                                                [0.114, 0.5, -0.081, 0], [0, 0, 0, 1]], np.float32)
+    yuv *= np.array([48, 7, 6, 24], np.float32)
+    at = _neighbors(yuv, 2)
+    raw = _neighbors(pixels, 2)
+
+    def dist(p, q):
+        return np.abs(at(*p) - at(*q)).sum(axis=2)
+
+    # Offsets of the neighbors of E, named as in the xBR papers
+    B, C, D, E, F = (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1)
+    G, H, I = (1, -1), (1, 0), (1, 1)
+    F4, I4, H5, I5 = (0, 2), (1, 2), (2, 0), (2, 1)
+    # Weight of an edge along the H-F diagonal against one along E-I
+    across = dist(E, C) + dist(E, G) + dist(I, F4) + dist(I, H5) + 4 * dist(H, F)
+    along = dist(H, D) + dist(H, I5) + dist(F, I4) + dist(F, B) + 4 * dist(E, I)
+    edge = (across < along) & (dist(E, F) > 0) & (dist(E, H) > 0)
+    new = np.where((dist(E, F) <= dist(E, H))[..., None], raw(*F), raw(*H))
+    blended = ((raw(*E).astype(np.uint16) + new) >> 1).astype(np.uint8)
+    return np.where(edge[..., None], blended, raw(*E))
+
+
+def scale_xbr2x(pixels):
+    """2xBR: corners on a detected diagonal edge are blended halfway toward the edge color."""
+    # The bottom-right rule is applied to the image turned four ways, one corner each
+    corners = [np.rot90(_xbr_bottom_right(np.rot90(pixels, k)), -k) for k in range(4)]
+    return _interleave(corners[2], corners[3], corners[1], corners[0])
+
+
+UPSCALERS = {"nearest": scale_nearest2x, "scale2x": scale_epx2x, "xbr": scale_xbr2x}
+# Textures the game reads as fixed-size lookup tables rather than draws; upscaled packs copy them as they are
+UNSCALED_TEXTURES = (PACK_TEXTURES + "colormap/",)
+
+
+def upscale_image(image, factor=2, method="scale2x"):
+    """image scaled up by factor (2, 4 or 8) with a pixel-art scaler from UPSCALERS, applied 2x at a time."""
+    pixels = np.asarray(image.convert("RGBA"))
+    for _ in range(factor.bit_length() - 1):
+        pixels = UPSCALERS[method](pixels)
+    return Image.fromarray(np.ascontiguousarray(pixels), "RGBA")
+
+
+def upscale_pack(inputs, output_path, factor=4, method="scale2x", workers=None):
+    """Write a resource pack of every texture in inputs (PNG files, directories or version zips) scaled up.
+
+    Textures are read lazily and scaled and encoded by export_resource_pack's
+    worker processes; UNSCALED_TEXTURES are copied unscaled. Returns the
+    number of textures written.
+    """
+    if factor not in (2, 4, 8):
+        raise ValueError(f"Scale factor must be 2, 4 or 8, got {factor}.")
+    archives = [zipfile.ZipFile(path) for path in inputs if path.lower().endswith(".zip")]
+    files = expand_texture_paths([path for path in inputs if not path.lower().endswith(".zip")])
+    metadata = {}
+    for archive in archives:
+        metadata.update((pack_texture_path(name[:-7]), archive.read(name)) for name in archive.namelist() if name.lower().endswith(".png.mcmeta"))
+
+    def textures():
+        for archive in archives:
+            for name in archive.namelist():
+                if name.lower().endswith(".png"):
+                    yield pack_texture_path(name), archive.read(name)
+        for path in files:
+            yield pack_texture_path(path), path
+
+    try:
+        return export_resource_pack(textures(), output_path, f"{factor}x {method} upscale", workers=workers,
+                                    transform=functools.partial(upscale_image, factor=factor, method=method), metadata=metadata,
+                                    untransformed=UNSCALED_TEXTURES)
+    finally:
+        for archive in archives:
+            archive.close()
+
+
+SIMILAR_DISTANCE = 10  # Largest hash distance "Find Similar" lists
+
+
+def texture_hash(source):
+    """88-bit perceptual hash of a texture (file path, PNG bytes or PIL image).
+
+    The low 64 bits are a difference hash of the image's brightness on a 9x8
+    grid, after compositing it over gray so transparency counts; the top 24
+    bits code its mean R, G and B in 8 levels each as runs of ones, so the
+    Hamming distance between hashes grows with both shape and color
+    differences and recolors of one pattern are near but not equal.
+    """
+    if isinstance(source, Image.Image):
+        image = source.convert("RGBA")
+    else:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as opened:
+            image = opened.convert("RGBA")
+    image = Image.alpha_composite(Image.new("RGBA", image.size, (128, 128, 128, 255)), image)
+    gray = np.asarray(image.convert("L").resize((9, 8), Image.BOX), np.int16)
+    value = int.from_bytes(np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes(), "big")
+    for channel in np.asarray(image)[..., :3].reshape(-1, 3).mean(axis=0):
+        level = int(channel) * 8 // 256
+        value = value << 8 | ((1 << level) - 1)
+    return value
+
+
+class BKTree:
+    """Burkhard-Keller tree of hashes under the Hamming distance.
+
+    Nodes are [hash, items, {distance: child}]; a query only descends into
+    children whose edge distance can still hold a match (triangle inequality).
+    """
+
+    def __init__(self, hashes=()):
+        self.root = None
+        self.hashes = {}  # item -> hash
+        for item, value in hashes:
+            self.add(value, item)
+
+    def add(self, value, item):
+        self.hashes[item] = value
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = node[2][distance]
+
+    def query(self, value, radius):
+        """[(distance, item)] of every item within radius of value, nearest first."""
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ value).bit_count()
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            stack.extend(child for edge, child in node[2].items() if distance - radius <= edge <= distance + radius)
+        return sorted(results)
+
+    def nodes(self):
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            yield node[0], node[1]
+            stack.extend(node[2].values())
+
+    def clusters(self, radius=0):
+        """Groups of two or more items linked by hashes within radius of each other, biggest first."""
+        seen = set()
+        clusters = []
+        for value, _ in self.nodes():
+            if value in seen:
+                continue
+            seen.add(value)
+            cluster, frontier = [], [value]
+            while frontier:
+                for distance, item in self.query(frontier.pop(), radius):
+                    cluster.append(item)
+                    neighbor = self.hashes[item]
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        frontier.append(neighbor)
+            if len(cluster) > 1:
+                clusters.append(sorted(set(cluster)))
+        return sorted(clusters, key=len, reverse=True)
+
+
+def hash_job(key, source):
+    return key, texture_hash(source)
+
+
+def texture_sources():
+    """(key, stamp, source) of every texture under TEXTURES_DIR and in the version zips.
+
+    Files are keyed by path; zip entries by the zip's path joined with the
+    entry name, and read only when they are yielded. stamp changes whenever
+    the texture might have.
+    """
+    if os.path.exists(TEXTURES_DIR):
+        for path in expand_texture_paths([TEXTURES_DIR]):
+            stat = os.stat(path)
+            yield path, (stat.st_size, stat.st_mtime_ns), path
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for directory in (script_dir, TEXTURES_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for zip_name in sorted(f for f in os.listdir(directory) if f.lower().endswith(".zip")):
+            zip_path = os.path.join(directory, zip_name)
+            with zipfile.ZipFile(zip_path) as archive:
+                for info in archive.infolist():
+                    if info.filename.lower().endswith(".png"):
+                        yield f"{zip_path}/{info.filename}", (info.file_size, info.CRC), lambda archive=archive, info=info: archive.read(info)
+
+
+def read_texture_key(key):
+    """PNG file path or PNG bytes behind a texture_sources() key."""
+    zip_path, separator, entry = key.partition(".zip/")
+    if not separator:
+        return key
+    with zipfile.ZipFile(zip_path + ".zip") as archive:
+        return archive.read(entry)
+
+
+def texture_hash_index(workers=None):
+    """BKTree of the perceptual hash of every texture from texture_sources().
+
+    Hashes are kept in HASH_INDEX_FILE and only textures that are new or
+    changed since the last run are hashed, by worker processes.
+    """
+    cache = {}
+    if os.path.exists(HASH_INDEX_FILE):
+        try:
+            with open(HASH_INDEX_FILE, "rb") as f:
+                cache = pickle.load(f)
+        except:
+            cache = {}
+    index = {}
+    stale = {}
+
+    def jobs():
+        for key, stamp, source in texture_sources():
+            if cache.get(key, (None,))[0] == stamp:
+                index[key] = cache[key]
+            else:
+                stale[key] = stamp
+                yield key, source() if callable(source) else source
+
+    for key, value in map_files(hash_job, jobs(), workers):
+        index[key] = (stale[key], value)
+    if stale or index.keys() != cache.keys():
+        os.makedirs(INSTALL_DIR, exist_ok=True)
+        with open(HASH_INDEX_FILE + ".tmp", "wb") as f:
+            pickle.dump(index, f)
+        os.replace(HASH_INDEX_FILE + ".tmp", HASH_INDEX_FILE)
+    return BKTree((key, value) for key, (stamp, value) in index.items())
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan_mtimes(roots, files=()):
+    """{path: (mtime_ns, size)} of every file under roots, plus the given files.
+
+    Directories are walked with os.scandir, whose entries carry their stat
+    results on Windows, so a scan costs one directory read per directory
+    rather than one system call per file. Files that vanish mid-scan are
+    left out.
+    """
+    index = {}
+    stack = [root for root in roots if os.path.isdir(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        else:
+                            stat = entry.stat()
+                            index[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    for path in files:
+        try:
+            index[path] = file_stamp(path)
+        except OSError:
+            continue
+    return index
+
 
 class MinecraftTextureEditor:
     def __init__(self, root):
@@ -17,22 +1846,105 @@ class MinecraftTextureEditor:
         self.root.geometry("1200x800")
 
         # Variables
-        self.image = None
-        self.tk_image = None
+        self.image = None  # PixelBuffer of the active document
+        self.render_tiles = {}  # (column, row) -> (image box, PhotoImage, canvas item) of the tiles in view
+        self.render_key = None  # What the tiles were built for; a change means a full rebuild
         self.current_tool = "paint"
         self.current_color = (0, 0, 0, 255)  # RGBA
         self.zoom_factor = 16  # Start at 1600%
         self.is_drawing = False
         self.undo_stack = []
         self.redo_stack = []
-        self.projects = {}
+        self.projects = None  # Loaded on first use by load_projects
+        self.custom_patterns = None  # User-defined combine pattern formulas by name, loaded on first use
         self.color_swatch = None
-        self.last_action = None
         self.show_grid = True
         self.grid_size_x = 1  # Grid size in pixels (X), integer
         self.grid_size_y = 1  # Grid size in pixels (Y), integer
         self.update_canvas_id = None  # To track the after ID for update_canvas
+        self.last_canvas_update = 0.0  # perf_counter() of the last redraw
+        self.last_stroke_point = None  # Image pixel of the previous paint/erase event
+        self.stroke_mask = None  # Tile -> mask of pixels already blended by the current stroke (Blend mode)
+        self.brush_size = 1
+        self.brush_shape = "Square"
+        self.brush_mode = "Replace"
+        self.brush_dither = "Solid"
+        self.stroke_box = None  # Bounding box (left, top, right, bottom) changed by the current stroke
+
+        # Selection variables
+        self.selection = None  # (box, boolean mask of the selected pixels within box)
+        self.selection_start = None  # Image pixel where a rectangle selection / move began
+        self.selection_offset = (0, 0)  # Offset of an in-progress move
+        self.clipboard = None  # (pixels, mask, (left, top)) of copied selection
+        self.hue_shift = 30  # Degrees used by the Hue Shift button
         self.textures_setup_done = False  # Flag to track if Textures tab is set up
+        self.editor_setup_done = False  # Flag to track if Editor tab is set up
+        self.canvas_stale = False  # Image changed while the Editor tab was hidden
+
+        # Open documents: dicts with name, path, image, undo_stack, redo_stack and,
+        # while spilled to disk, spill_file. self.image and the undo/redo stacks
+        # are those of the active document.
+        self.documents = []
+        self.active_document = None
+        self.document_clock = itertools.count()  # Orders documents by last use
+        self.spill_dir = None  # Created on first spill, removed at exit
+
+        # Animated textures are edited one frame at a time: self.image is then a
+        # view of the current frame's rows of the document's strip
+        self.animation = None  # read_animation() layout of the active document, plus the current frame
+        self.frame_cache = {}  # Frame index -> zoomed PhotoImage for playback
+        self.frame_cache_key = None  # (zoom, tint) the cached frames were drawn with
+        self.playback_id = None
+        self.journal_ids = itertools.count()  # Numbers this session's journal files
+        # Journals are named after the session; its lock file stays locked while the
+        # editor runs, so other instances only recover journals of dead sessions
+        self.session = uuid.uuid4().hex
+        self.session_lock = None
+        try:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            self.session_lock = lock_file(os.path.join(JOURNAL_DIR, f"{self.session}.lock"))
+        except OSError as e:
+            print(f"Error locking journal session: {str(e)}")
+
+        # Biome tint preview: multiplied into the display only, never the document
+        self.tint = None  # (colormap name, biome) or None
+        self.tint_cache = {}  # tint -> tinted copy of tint_source's pixels, kept in step with edits; least recently used first
+        self.tint_source = None  # PixelBuffer the tint cache was built from
+
+        # Tiling preview window: copies x copies canvas items sharing one PhotoImage,
+        # so a stroke updates every copy with a single paste
+        self.tiling_window = None
+        self.tiling_key = None  # (image, size, tint, copies) the preview was built for
+        self.tiling_pixels = None  # Scaled display pixels behind tiling_photo
+        self.tiling_photo = None
+        self.tiling_seams = None  # edge_seams() of the image, kept in step with edits
+
+        # Mipmap preview window: every level of the game's mip chain side by side
+        self.mipmap_window = None
+        self.mipmap_key = None  # (image, size, tint) the chain was built for
+        self.mipmap_clear_rows = None  # Fully transparent pixels per row of the image, kept in step with edits
+        self.mipmap_transparent = False  # Whether the chain was built with cutout blending
+        self.mipmap_chain = None  # [level 0 pixels, level 1, ...], level 0 being the image itself
+        self.mipmap_photos = []
+        self.mipmap_size = None  # Size every level is drawn at
+
+        # 3D preview window: the texture on an isometric cube or as an extruded item,
+        # drawn through precomputed gather maps whenever the texture changes
+        self.model_window = None
+        self.model_key = None  # (image, size, tint, mode) last drawn
+        self.model_photo = None
+
+        # Background image loading
+        self.load_queue = queue.Queue()  # (token, image or exception, callback) from loader threads
+        self.load_tokens = {}  # Per target; results of loads older than the newest one are dropped
+        self.pending_loads = 0
+        self.load_poll_id = None
+
+        # File watcher: TEXTURES_DIR and open documents' files are rescanned every
+        # WATCH_INTERVAL_MS on a loader thread and compared with the previous scan
+        self.watch_index = None  # scan_mtimes() result of the last scan; None before the first
+        self.watch_noted = {}  # Stamps of files the editor opened or wrote since the running scan began
+        self.tree_nodes = {}  # Path -> Textures tree node of every listed file and directory
 
         # Overlay mode variables
         self.overlay_mode = False
@@ -50,15 +1962,19 @@ class MinecraftTextureEditor:
         # Textures tab variables
         self.current_image_path = None  # Path of selected image in Textures tab
 
-        # Load projects
-        self.load_projects()
-
-        # GUI Setup
+        # GUI Setup (projects, patterns and the Textures tree are loaded on first use)
         self.setup_ui()
+        mark_startup("editor ui")
 
         # Drag-and-Drop Setup for the entire window (for main editor)
         self.root.drop_target_register(DND_FILES)
         self.root.dnd_bind('<<Drop>>', self.on_drop)
+        mark_startup("drag and drop")
+
+        # Journals left behind by a session that didn't exit cleanly
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after_idle(self.recover_journals)
+        self.root.after(WATCH_INTERVAL_MS, self.watch_files)
 
     def setup_ui(self):
         # Cancel any pending update_canvas calls
@@ -94,23 +2010,18 @@ class MinecraftTextureEditor:
         self.notebook.add(self.editor_frame, text="Editor")
         self.setup_editor_tab()
 
-        # Textures Tab
+        # Textures Tab (built when first selected, see on_tab_changed)
         self.textures_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.textures_frame, text="Textures")
-        self.setup_textures_tab()
 
         # Bind tab change event
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
     def setup_editor_tab(self):
-        # Cancel any pending update_canvas calls
-        if self.update_canvas_id is not None:
-            self.root.after_cancel(self.update_canvas_id)
-            self.update_canvas_id = None
-
-        # Clear the editor frame
-        for widget in self.editor_frame.winfo_children():
-            widget.destroy()
+        # The editor is built once and kept alive across tab switches
+        if self.editor_setup_done:
+            return
+        self.editor_setup_done = True
 
         # Top Frame for Undo/Redo and Zoom
         self.top_frame = tk.Frame(self.editor_frame, bg="#1a1a1a")
@@ -123,6 +2034,22 @@ class MinecraftTextureEditor:
         self.zoom_in_btn.pack(side="left", padx=5, pady=5)
         self.zoom_out_btn = tk.Button(self.top_frame, text="Zoom Out", command=self.zoom_out, bg="#252525", fg="white", bd=0)
         self.zoom_out_btn.pack(side="left", padx=5, pady=5)
+        tk.Label(self.top_frame, text="Document:", bg="#1a1a1a", fg="white").pack(side="left", padx=(10, 0))
+        self.document_combo = ttk.Combobox(self.top_frame, state="readonly", width=28)
+        self.document_combo.pack(side="left", padx=5)
+        self.document_combo.bind("<<ComboboxSelected>>", self.on_document_selected)
+        tk.Button(self.top_frame, text="Close", command=self.close_document, bg="#252525", fg="white", bd=0).pack(side="left", padx=5, pady=5)
+        # Frame controls, shown for animated textures
+        self.animation_controls = tk.Frame(self.top_frame, bg="#1a1a1a")
+        tk.Button(self.animation_controls, text="◀", command=lambda: self.step_frame(-1), bg="#252525", fg="white", bd=0).pack(side="left", padx=2)
+        self.frame_label = tk.Label(self.animation_controls, text="", bg="#1a1a1a", fg="white")
+        self.frame_label.pack(side="left", padx=2)
+        tk.Button(self.animation_controls, text="▶", command=lambda: self.step_frame(1), bg="#252525", fg="white", bd=0).pack(side="left", padx=2)
+        self.play_btn = tk.Button(self.animation_controls, text="Play", command=self.toggle_playback, bg="#252525", fg="white", bd=0)
+        self.play_btn.pack(side="left", padx=5)
+        self.loading_label = tk.Label(self.top_frame, text="", bg="#1a1a1a", fg="white")
+        self.loading_label.pack(side="left", padx=10)
+        self.loading_bar = ttk.Progressbar(self.top_frame, mode="indeterminate", length=120)  # Packed while loading
 
         # Sidebar
         self.sidebar = tk.Frame(self.editor_frame, bg="#252525", width=200)
@@ -132,8 +2059,10 @@ class MinecraftTextureEditor:
         tk.Button(self.sidebar, text="New Project", command=self.new_project, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
         tk.Button(self.sidebar, text="Import", command=self.import_image, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
         tk.Button(self.sidebar, text="Export", command=self.export_image, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
+        tk.Button(self.sidebar, text="Export Pack", command=self.export_pack, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
         tk.Button(self.sidebar, text="Save Project", command=self.save_project, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
         tk.Button(self.sidebar, text="Projects", command=self.show_projects, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
+        tk.Button(self.sidebar, text="Find Similar", command=self.find_similar, bg="#3a3a3a", fg="white").pack(fill="x", pady=5)
 
         # Image Combiner Dropdown
         self.combiner_frame = tk.Frame(self.sidebar, bg="#252525")
@@ -148,13 +2077,54 @@ class MinecraftTextureEditor:
         # Tools
         self.tools_frame = tk.LabelFrame(self.sidebar, text="Tools", bg="#252525", fg="white")
         self.tools_frame.pack(fill="x", pady=10)
-        self.paint_btn = tk.Button(self.tools_frame, text="Paint", command=lambda: self.set_tool("paint"), bg="#5a5a5a", fg="white")
-        self.paint_btn.pack(fill="x")
-        tk.Button(self.tools_frame, text="Erase", command=lambda: self.set_tool("erase"), bg="#3a3a3a", fg="white").pack(fill="x")
-        tk.Button(self.tools_frame, text="Eyedropper", command=lambda: self.set_tool("eyedropper"), bg="#3a3a3a", fg="white").pack(fill="x")
-        tk.Button(self.tools_frame, text="Paint Bucket", command=lambda: self.set_tool("bucket"), bg="#3a3a3a", fg="white").pack(fill="x")
+        self.tool_buttons = {}
+        for tool, text in TOOLS:
+            btn = tk.Button(self.tools_frame, text=text, command=lambda tool=tool: self.set_tool(tool), bg="#5a5a5a" if tool == self.current_tool else "#3a3a3a", fg="white")
+            btn.pack(fill="x")
+            self.tool_buttons[tool] = btn
         tk.Button(self.tools_frame, text="Toggle Grid", command=self.toggle_grid, bg="#3a3a3a", fg="white").pack(fill="x", pady=2)
 
+        # Brush Controls
+        self.brush_frame = tk.LabelFrame(self.sidebar, text="Brush", bg="#252525", fg="white")
+        self.brush_frame.pack(fill="x", pady=5)
+        tk.Label(self.brush_frame, text="Size:", bg="#252525", fg="white").grid(row=0, column=0, sticky="w", padx=5)
+        self.brush_size_spinbox = tk.Spinbox(self.brush_frame, from_=1, to=64, width=5, command=self.update_brush_size, bg="#3a3a3a", fg="white", insertbackground="white")
+        self.brush_size_spinbox.delete(0, tk.END)
+        self.brush_size_spinbox.insert(0, str(self.brush_size))
+        self.brush_size_spinbox.grid(row=0, column=1, sticky="ew", padx=5)
+        self.brush_size_spinbox.bind("<Return>", self.update_brush_size)
+        brush_options = (
+            ("Shape:", "brush_shape", BRUSH_SHAPES),
+            ("Mode:", "brush_mode", BRUSH_MODES),
+            ("Pattern:", "brush_dither", list(BRUSH_DITHERS)),
+        )
+        for row, (label, attribute, options) in enumerate(brush_options, start=1):
+            tk.Label(self.brush_frame, text=label, bg="#252525", fg="white").grid(row=row, column=0, sticky="w", padx=5)
+            variable = tk.StringVar(value=getattr(self, attribute))
+            menu = tk.OptionMenu(self.brush_frame, variable, *options, command=lambda value, attribute=attribute: setattr(self, attribute, value))
+            menu.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+            menu.grid(row=row, column=1, sticky="ew", padx=5)
+
+        # Selection Controls
+        self.selection_frame = tk.LabelFrame(self.sidebar, text="Selection", bg="#252525", fg="white")
+        self.selection_frame.pack(fill="x", pady=5)
+        selection_buttons = (
+            ("Flip H", lambda: self.transform_selection(np.fliplr)),
+            ("Flip V", lambda: self.transform_selection(np.flipud)),
+            ("Rotate 90°", lambda: self.transform_selection(lambda a: np.rot90(a, -1))),
+            ("Deselect", self.clear_selection),
+            ("Copy", self.copy_selection),
+            ("Paste", self.paste_clipboard),
+        )
+        for i, (text, command) in enumerate(selection_buttons):
+            tk.Button(self.selection_frame, text=text, command=command, bg="#3a3a3a", fg="white").grid(row=i // 2, column=i % 2, sticky="ew")
+        self.hue_shift_spinbox = tk.Spinbox(self.selection_frame, from_=-180, to=180, increment=15, width=5, bg="#3a3a3a", fg="white", insertbackground="white")
+        self.hue_shift_spinbox.delete(0, tk.END)
+        self.hue_shift_spinbox.insert(0, str(self.hue_shift))
+        self.hue_shift_spinbox.grid(row=3, column=0, sticky="ew")
+        tk.Button(self.selection_frame, text="Hue Shift", command=self.hue_shift_selection, bg="#3a3a3a", fg="white").grid(row=3, column=1, sticky="ew")
+        self.selection_frame.columnconfigure((0, 1), weight=1)
+
         # Grid Size Controls
         self.grid_size_frame = tk.LabelFrame(self.sidebar, text="Grid Size", bg="#252525", fg="white")
         self.grid_size_frame.pack(fill="x", pady=5)
@@ -169,6 +2139,24 @@ class MinecraftTextureEditor:
         self.grid_size_y_entry.pack(side="left", padx=5)
         self.grid_size_y_entry.bind("<Return>", self.update_grid_size)
 
+        # Preview Controls
+        self.preview_frame = tk.LabelFrame(self.sidebar, text="Preview", bg="#252525", fg="white")
+        self.preview_frame.pack(fill="x", pady=5)
+        tk.Label(self.preview_frame, text="Tint:", bg="#252525", fg="white").grid(row=0, column=0, sticky="w", padx=5)
+        self.tint_var = tk.StringVar(value="None")
+        menu = tk.OptionMenu(self.preview_frame, self.tint_var, "None", *COLORMAPS, command=lambda value: self.set_tint())
+        menu.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+        menu.grid(row=0, column=1, sticky="ew", padx=5)
+        tk.Label(self.preview_frame, text="Biome:", bg="#252525", fg="white").grid(row=1, column=0, sticky="w", padx=5)
+        self.biome_var = tk.StringVar(value="Plains")
+        menu = tk.OptionMenu(self.preview_frame, self.biome_var, *BIOMES, command=lambda value: self.set_tint())
+        menu.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+        menu.grid(row=1, column=1, sticky="ew", padx=5)
+        tk.Button(self.preview_frame, text="Tiling Preview", command=self.open_tiling_preview, bg="#3a3a3a", fg="white").grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        tk.Button(self.preview_frame, text="Mipmap Preview", command=self.open_mipmap_preview, bg="#3a3a3a", fg="white").grid(row=3, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        tk.Button(self.preview_frame, text="3D Preview", command=self.open_model_preview, bg="#3a3a3a", fg="white").grid(row=4, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        self.preview_frame.columnconfigure(1, weight=1)
+
         # Color Picker
         self.color_frame = tk.LabelFrame(self.sidebar, text="Color", bg="#252525", fg="white")
         self.color_frame.pack(fill="x", pady=10)
@@ -203,12 +2191,24 @@ class MinecraftTextureEditor:
         self.canvas.bind("<Button-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
-        self.canvas.bind("<Button-1>", self.on_mouse_down if self.current_tool != "bucket" else self.paint_bucket)
+
+        # Scrolling and panning (middle button) for images bigger than the view
+        for sequence in ("<MouseWheel>", "<Shift-MouseWheel>", "<Button-4>", "<Button-5>", "<Shift-Button-4>", "<Shift-Button-5>"):
+            self.canvas.bind(sequence, self.on_canvas_scroll)
+        self.canvas.bind("<ButtonPress-2>", lambda event: self.canvas.scan_mark(event.x, event.y))
+        self.canvas.bind("<B2-Motion>", self.on_canvas_pan)
+        self.canvas.bind("<Configure>", self.realize_visible_tiles)
+        self.canvas_frame.bind("<Configure>", self.fit_canvas_view)
 
         # Bind Arrow Keys for Zoom
         self.root.bind("<Left>", lambda event: self.zoom_out())
         self.root.bind("<Right>", lambda event: self.zoom_in())
 
+        # Selection shortcuts
+        self.root.bind("<Escape>", lambda event: self.clear_selection())
+        self.root.bind("<Control-c>", lambda event: self.copy_selection())
+        self.root.bind("<Control-v>", lambda event: self.paste_clipboard())
+
         # Update canvas if an image is loaded
         if self.image:
             self.update_canvas()
@@ -226,6 +2226,7 @@ class MinecraftTextureEditor:
             self.tree.pack(fill="both", expand=True, padx=5, pady=5)
 
             self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+            self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
             self.populate_textures_tree()
             self.textures_setup_done = True  # Mark as set up
 
@@ -237,24 +2238,84 @@ class MinecraftTextureEditor:
         for item in self.tree.get_children():
             self.tree.delete(item)
 
+        self.unloaded_tree_dirs = {}  # Directory nodes not listed yet: node -> path
+        self.tree_nodes = {}
         for version_dir in os.listdir(TEXTURES_DIR):
             version_path = os.path.join(TEXTURES_DIR, version_dir)
             if os.path.isdir(version_path):
-                parent_node = self.tree.insert("", "end", text=version_dir, open=False)
-                self.add_files_to_tree(version_path, parent_node)
+                self.insert_directory_node("", version_dir, version_path)
+
+    def insert_directory_node(self, parent_node, name, path):
+        # Directories are listed when first opened; the placeholder child keeps the expand arrow
+        node = self.tree.insert(parent_node, "end", text=name, open=False)
+        self.tree.insert(node, "end", text="Loading...")
+        self.unloaded_tree_dirs[node] = path
+        self.tree_nodes[path] = node
+        return node
 
     def add_files_to_tree(self, directory, parent_node):
         try:
             for item in os.listdir(directory):
                 item_path = os.path.join(directory, item)
                 if os.path.isdir(item_path):
-                    child_node = self.tree.insert(parent_node, "end", text=item, open=False)
-                    self.add_files_to_tree(item_path, child_node)
+                    self.insert_directory_node(parent_node, item, item_path)
                 else:
-                    self.tree.insert(parent_node, "end", text=item, values=(item_path,))
+                    self.tree_nodes[item_path] = self.tree.insert(parent_node, "end", text=item, values=(item_path,))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load textures: {str(e)}")
 
+    def on_tree_open(self, event):
+        node = self.tree.focus()
+        directory = self.unloaded_tree_dirs.pop(node, None)
+        if directory is not None:
+            self.tree.delete(*self.tree.get_children(node))
+            self.add_files_to_tree(directory, node)
+
+    def add_tree_path(self, path):
+        # Show a file or directory that appeared on disk, if its directory is listed;
+        # unlisted directories pick it up when they are opened
+        if path in self.tree_nodes:
+            return
+        parent = os.path.dirname(path)
+        if parent == TEXTURES_DIR:
+            if os.path.isdir(path):
+                self.insert_directory_node("", os.path.basename(path), path)
+            return
+        if not parent.startswith(TEXTURES_DIR + os.sep):
+            return
+        if parent not in self.tree_nodes:
+            self.add_tree_path(parent)
+        parent_node = self.tree_nodes.get(parent)
+        if parent_node is None or parent_node in self.unloaded_tree_dirs:
+            return
+        if os.path.isdir(path):
+            self.insert_directory_node(parent_node, os.path.basename(path), path)
+        else:
+            self.tree_nodes[path] = self.tree.insert(parent_node, "end", text=os.path.basename(path), values=(path,))
+
+    def remove_tree_path(self, path):
+        # Drop the node of a file or directory gone from disk, and everything under it
+        node = self.tree_nodes.pop(path, None)
+        if node is None:
+            return
+        prefix = path + os.sep
+        for child in [p for p in self.tree_nodes if p.startswith(prefix)]:
+            self.unloaded_tree_dirs.pop(self.tree_nodes.pop(child), None)
+        self.unloaded_tree_dirs.pop(node, None)
+        if self.tree.exists(node):
+            self.tree.delete(node)
+
+    def update_tree_paths(self, added, removed):
+        for path in removed:
+            self.remove_tree_path(path)
+            # Directories emptied and deleted along with their files
+            directory = os.path.dirname(path)
+            while directory.startswith(TEXTURES_DIR + os.sep) and not os.path.isdir(directory):
+                self.remove_tree_path(directory)
+                directory = os.path.dirname(directory)
+        for path in sorted(added):
+            self.add_tree_path(path)
+
     def on_tree_select(self, event):
         selected_items = self.tree.selection()
         if not selected_items:
@@ -280,26 +2341,451 @@ class MinecraftTextureEditor:
             messagebox.showerror("Error", "No image selected to load.")
             return
 
+        self.open_file_async(self.current_image_path)
+
+    def open_file_async(self, file_path):
+        self.notebook.select(self.editor_frame)
+        name = os.path.basename(file_path)
+
+        def load():
+            image = open_rgba(file_path)
+            return image, read_animation(file_path, image.width, image.height)
+
+        self.load_image_async(load, lambda loaded: self.open_in_editor(loaded[0], name, file_path, animation=loaded[1]), name)
+
+    def open_in_editor(self, image, name="Untitled", path=None, undo_stack=None, redo_stack=None, animation=None):
+        # Open image (a PIL image or PixelBuffer) as a new document and switch to it
+        self.activate_document(self.add_document(image, name, path, undo_stack, redo_stack, animation))
+
+    def add_document(self, image, name, path=None, undo_stack=None, redo_stack=None, animation=None):
+        if isinstance(image, Image.Image):
+            image = PixelBuffer.from_image(image)
+        if animation is not None:
+            animation = dict(animation, frame=0)
+        document = {
+            "name": name,
+            "path": path,
+            "image": image,
+            "undo_stack": undo_stack or [],
+            "redo_stack": redo_stack or [],
+            "spill_file": None,
+            "last_used": next(self.document_clock),
+            "journal_file": os.path.join(JOURNAL_DIR, f"{self.session}-{next(self.journal_ids)}.journal"),
+            "journal_records": 0,
+            "animation": animation,
+        }
+        self.documents.append(document)
+        if path:
+            self.note_file_stamp(path)
+        try:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            write_journal_snapshot(document["journal_file"], name, path, image, document["undo_stack"], document["redo_stack"])
+        except OSError as e:
+            print(f"Error writing journal for {name}: {str(e)}")
+            document["journal_file"] = None
+        return document
+
+    def journal(self, *record):
+        # Append one edit to the active document's journal; every
+        # JOURNAL_COMPACT_RECORDS records it is compacted into a fresh snapshot
+        document = self.active_document
+        if document is None or not document["journal_file"]:
+            return
+        try:
+            document["journal_records"] += 1
+            if document["journal_records"] >= JOURNAL_COMPACT_RECORDS:
+                write_journal_snapshot(document["journal_file"], document["name"], document["path"], self.document_image(), self.undo_stack, self.redo_stack)
+                document["journal_records"] = 0
+            else:
+                append_journal(document["journal_file"], record)
+        except OSError as e:
+            print(f"Error writing journal for {document['name']}: {str(e)}")
+
+    def remove_journal(self, document):
+        if document["journal_file"] and os.path.exists(document["journal_file"]):
+            os.remove(document["journal_file"])
+
+    def recover_journals(self):
+        if not os.path.isdir(JOURNAL_DIR):
+            return
+        # Journals by session; lock files of sessions without journals are swept up too
+        sessions = {}
+        for f in sorted(os.listdir(JOURNAL_DIR)):
+            if f.endswith(".journal"):
+                sessions.setdefault(f.rsplit("-", 1)[0], []).append(os.path.join(JOURNAL_DIR, f))
+            elif f.endswith(".lock"):
+                sessions.setdefault(f[:-len(".lock")], [])
+        sessions.pop(self.session, None)
+
+        # Only sessions whose lock can be taken are dead; their locks are held until
+        # their journals are dealt with, so no other instance takes them over too
+        locks = []
+        journal_files = []
+        for session, files in sessions.items():
+            lock_path = os.path.join(JOURNAL_DIR, f"{session}.lock")
+            try:
+                lock = lock_file(lock_path)
+            except OSError:
+                continue
+            if lock is not None:
+                locks.append((lock, lock_path, files))
+                journal_files.extend(files)
         try:
-            self.image = Image.open(self.current_image_path).convert("RGBA")
-            self.undo_stack = [self.image.copy()]
-            self.redo_stack = []
+            answer = False
+            if journal_files:
+                answer = messagebox.askyesnocancel("Recover", f"{len(journal_files)} document(s) were not closed properly. Recover them?\n\n"
+                                                   "No discards them, Cancel keeps them for next time.")
+            if answer is None:
+                return
+            for journal_file in journal_files:
+                if answer:
+                    try:
+                        document = replay_journal(journal_file)
+                    except Exception as e:
+                        # Kept, to be offered again next time
+                        print(f"Error replaying journal {journal_file}: {str(e)}")
+                        continue
+                    if document is not None:
+                        image, source = document["image"], document["path"]
+                        animation = read_animation(source, image.width, image.height) if source else None
+                        self.open_in_editor(image, document["name"], source, document["undo_stack"], document["redo_stack"], animation)
+                # Replayed into a document with a journal of its own, or discarded
+                os.remove(journal_file)
+        finally:
+            for lock, lock_path, files in locks:
+                lock.close()
+                if not any(os.path.exists(f) for f in files):
+                    os.remove(lock_path)
+
+    def on_close(self):
+        # A clean exit leaves no journals to recover
+        for document in self.documents:
+            self.remove_journal(document)
+        if self.session_lock is not None:
+            self.session_lock.close()
+            os.remove(self.session_lock.name)
+        self.root.destroy()
+
+    def store_active_document(self):
+        # Write the editor's working state back into the active document
+        if self.active_document is not None:
+            self.active_document.update(image=self.document_image(), undo_stack=self.undo_stack, redo_stack=self.redo_stack)
+
+    def document_image(self):
+        # The active document's whole image, even while a single frame is shown
+        return self.active_document["image"] if self.animation else self.image
+
+    def activate_document(self, document):
+        self.store_active_document()
+        self.stop_playback()
+        if document["spill_file"]:
+            self.restore_document(document)
+        self.active_document = document
+        document["last_used"] = next(self.document_clock)
+        self.image = document["image"]
+        self.undo_stack = document["undo_stack"]
+        self.redo_stack = document["redo_stack"]
+        self.animation = document["animation"]
+        self.frame_cache = {}
+        if self.animation:
+            self.image = self.frame_buffer(self.animation["frame"])
+        self.update_animation_controls()
+        self.clear_selection()
+        self.update_undo_redo_buttons()
+        self.update_canvas()
+        self.notebook.select(self.editor_frame)
+        self.enforce_memory_budget()
+        self.refresh_document_list()
+
+    def frame_buffer(self, frame):
+        # PixelBuffer over one frame's rows of the strip, sharing its pixels
+        frame_height = self.animation["frame_height"]
+        return PixelBuffer(self.active_document["image"].pixels[frame * frame_height:(frame + 1) * frame_height])
+
+    def frame_top(self):
+        # Row of the strip the shown frame starts at (0 for ordinary images)
+        return self.animation["frame"] * self.animation["frame_height"] if self.animation else 0
+
+    def update_animation_controls(self):
+        if self.animation:
+            self.frame_label.config(text=f"Frame {self.animation['frame'] + 1}/{self.animation['frame_count']}")
+            self.animation_controls.pack(side="left", padx=10, before=self.loading_label)
+        else:
+            self.animation_controls.pack_forget()
+
+    def show_frame(self, frame):
+        self.stop_playback()
+        self.animation["frame"] = frame % self.animation["frame_count"]
+        self.image = self.frame_buffer(self.animation["frame"])
+        self.update_animation_controls()
+        self.clear_selection()
+        self.update_canvas()
+
+    def step_frame(self, step):
+        if self.animation:
+            self.show_frame(self.animation["frame"] + step)
+
+    def toggle_playback(self):
+        if self.playback_id is not None:
+            self.stop_playback()
+        elif self.animation:
+            self.play_btn.config(text="Stop")
+            self.play_animation(0)
+
+    def play_animation(self, step):
+        # Cycle through the .mcmeta frame order, drawing cached frame images over the canvas
+        index, ticks = self.animation["frames"][step % len(self.animation["frames"])]
+        self.canvas.delete("playback")
+        self.canvas.create_image(0, 0, anchor="nw", image=self.frame_photo(index), tags="playback")
+        self.frame_label.config(text=f"Frame {index + 1}/{self.animation['frame_count']}")
+        self.playback_id = self.root.after(ticks * TICK_MS, self.play_animation, step + 1)
+
+    def stop_playback(self):
+        if self.playback_id is None:
+            return
+        self.root.after_cancel(self.playback_id)
+        self.playback_id = None
+        self.canvas.delete("playback")
+        self.play_btn.config(text="Play")
+        self.update_animation_controls()
+
+    def frame_photo(self, index):
+        if self.frame_cache_key != (self.zoom_factor, self.tint):
+            self.frame_cache, self.frame_cache_key = {}, (self.zoom_factor, self.tint)
+        if index not in self.frame_cache:
+            if len(self.frame_cache) >= ANIMATION_CACHE_FRAMES:
+                del self.frame_cache[next(iter(self.frame_cache))]
+            frame_height = self.animation["frame_height"]
+            pixels = self.active_document["image"].pixels[index * frame_height:(index + 1) * frame_height]
+            if self.tint is not None:
+                pixels = tint_pixels(pixels, self.tint_color(self.tint))
+            if self.zoom_factor > 1:
+                pixels = pixels.repeat(self.zoom_factor, axis=0).repeat(self.zoom_factor, axis=1)
+            self.frame_cache[index] = ImageTk.PhotoImage(Image.fromarray(pixels, "RGBA"))
+        return self.frame_cache[index]
+
+    def enforce_memory_budget(self):
+        # Spill inactive documents, least recently used first, until the ones
+        # left in memory fit DOCUMENT_MEMORY_BUDGET
+        in_memory = [d for d in self.documents if not d["spill_file"]]
+        total = sum(document_bytes(d) for d in in_memory)
+        for document in sorted(in_memory, key=lambda d: d["last_used"]):
+            if total <= DOCUMENT_MEMORY_BUDGET:
+                break
+            if document is not self.active_document:
+                total -= document_bytes(document)
+                self.spill_document(document)
+
+    def spill_document(self, document):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="MinecraftTextureEditor-")
+            atexit.register(shutil.rmtree, self.spill_dir, True)
+        spill_file = os.path.join(self.spill_dir, f"{id(document)}.pkl")
+        data = {
+            "image": pack_buffer(document["image"]),
+            "undo_stack": pack_history(document["undo_stack"]),
+            "redo_stack": pack_history(document["redo_stack"]),
+        }
+        with open(spill_file, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        document.update(image=None, undo_stack=None, redo_stack=None, spill_file=spill_file)
+
+    def restore_document(self, document):
+        with open(document["spill_file"], "rb") as f:
+            data = pickle.load(f)
+        os.remove(document["spill_file"])
+        document.update(
+            image=unpack_buffer(data["image"]),
+            undo_stack=unpack_history(data["undo_stack"]),
+            redo_stack=unpack_history(data["redo_stack"]),
+            spill_file=None,
+        )
+
+    def close_document(self):
+        document = self.active_document
+        if document is None:
+            return
+        self.stop_playback()
+        self.documents.remove(document)
+        self.remove_journal(document)
+        self.active_document = None
+        self.animation = None
+        if self.documents:
+            self.activate_document(max(self.documents, key=lambda d: d["last_used"]))
+        else:
+            self.image = None
+            self.undo_stack, self.redo_stack = [], []
+            self.update_animation_controls()
+            self.clear_selection()
             self.update_undo_redo_buttons()
             self.update_canvas()
-            self.notebook.select(self.editor_frame)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+            self.refresh_document_list()
+
+    def refresh_document_list(self):
+        self.document_combo["values"] = [d["name"] + (" (on disk)" if d["spill_file"] else "") for d in self.documents]
+        if self.active_document is not None:
+            self.document_combo.current(self.documents.index(self.active_document))
+        else:
+            self.document_combo.set("")
+
+    def on_document_selected(self, event):
+        document = self.documents[self.document_combo.current()]
+        if document is not self.active_document:
+            self.activate_document(document)
+
+    def load_image_async(self, source, on_loaded, description, target="editor", on_error=None):
+        # Decode source (a file path, or a callable returning an image) on a worker
+        # thread; on_loaded receives the image (on_error any exception) on the Tk
+        # thread via load_queue. Only the newest load for each target is applied,
+        # older results are dropped.
+        token = self.load_tokens.get(target, 0) + 1
+        self.load_tokens[target] = token
+        self.pending_loads += 1
+
+        def work():
+            try:
+                result = source() if callable(source) else open_rgba(source)
+            except Exception as e:
+                result = e
+            self.load_queue.put((target, token, result, on_loaded, on_error))
+
+        threading.Thread(target=work, daemon=True).start()
+        if target == "editor":
+            self.show_loading(description)
+        if self.load_poll_id is None:
+            self.load_poll_id = self.root.after(LOAD_POLL_MS, self.poll_load_queue)
+
+    def poll_load_queue(self):
+        self.load_poll_id = None
+        while True:
+            try:
+                target, token, result, on_loaded, on_error = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.pending_loads -= 1
+            if token != self.load_tokens[target]:
+                continue
+            if target == "editor":
+                self.hide_loading()
+            if isinstance(result, Exception) and on_error is not None:
+                on_error(result)
+            elif isinstance(result, Exception):
+                messagebox.showerror("Error", f"Failed to load image: {str(result)}")
+            else:
+                on_loaded(result)
+        if self.pending_loads:
+            self.load_poll_id = self.root.after(LOAD_POLL_MS, self.poll_load_queue)
+
+    def watch_files(self):
+        # Rescan on a loader thread; the next scan is scheduled once this one is applied
+        files = [os.path.abspath(d["path"]) for d in self.documents if d["path"]]
+        self.watch_noted = {}
+        self.load_image_async(lambda: scan_mtimes([TEXTURES_DIR], files), self.apply_file_changes,
+                              "file scan", target="watch", on_error=self.on_watch_error)
+
+    def on_watch_error(self, error):
+        print(f"Error scanning for changed files: {str(error)}")
+        self.root.after(WATCH_INTERVAL_MS, self.watch_files)
+
+    def apply_file_changes(self, index):
+        # Compare a scan with the previous one and update only what changed:
+        # Textures tree nodes, colormaps and open documents. Files noted while the
+        # scan ran may be newer than what it saw, so their stamps win
+        index.update(self.watch_noted)
+        self.watch_noted = {}
+        previous, self.watch_index = self.watch_index, index
+        if previous is not None and index != previous:
+            added = index.keys() - previous.keys()
+            removed = previous.keys() - index.keys()
+            changed = {path for path in index.keys() & previous.keys() if index[path] != previous[path]}
+            if any(os.path.basename(os.path.dirname(path)) == "colormap" for path in added | removed | changed):
+                self.reload_colormaps()
+            if getattr(self, "textures_setup_done", False):
+                self.update_tree_paths(added, removed)
+            for document in list(self.documents):
+                if document["path"] and os.path.abspath(document["path"]) in changed:
+                    self.offer_reload(document)
+        self.root.after(WATCH_INTERVAL_MS, self.watch_files)
+
+    def note_file_stamp(self, path):
+        # The file as it is now is what the editor has (just opened or written),
+        # so the next scan shouldn't see it as an external edit
+        try:
+            stamp = file_stamp(path)
+        except OSError:
+            return
+        self.watch_noted[os.path.abspath(path)] = stamp
+        if self.watch_index is not None:
+            self.watch_index[os.path.abspath(path)] = stamp
+
+    def reload_colormaps(self):
+        _colormaps.clear()
+        self.tint_cache, self.tint_source = {}, None
+        if self.tint is not None:
+            if find_colormap(self.tint[0]) is None:
+                self.tint_var.set("None")
+                self.tint = None
+            self.render_key = None
+            self.frame_cache_key = None
+            self.update_canvas()
+
+    def offer_reload(self, document):
+        if not messagebox.askyesno("File Changed", f"{document['name']} was changed outside the editor. Reload it?\n\nEdits made to it here will be lost."):
+            return
+        path = document["path"]
+
+        def load():
+            image = open_rgba(path)
+            return image, read_animation(path, image.width, image.height)
+
+        self.load_image_async(load, lambda loaded: self.reload_document(document, *loaded), document["name"])
+
+    def reload_document(self, document, image, animation):
+        # Replace a document with a fresh copy of its file, in the same place in the list
+        if document not in self.documents:
+            return
+        was_active = document is self.active_document
+        fresh = self.add_document(image, document["name"], document["path"], animation=animation)
+        self.documents.remove(fresh)
+        self.documents[self.documents.index(document)] = fresh
+        self.remove_journal(document)
+        if document["spill_file"]:
+            os.remove(document["spill_file"])
+        if was_active:
+            self.stop_playback()
+            self.active_document = None
+            self.activate_document(fresh)
+        else:
+            self.refresh_document_list()
+
+    def show_loading(self, description):
+        self.loading_label.config(text=f"Loading {description}...")
+        self.loading_bar.pack(side="left", padx=5)
+        self.loading_bar.start(10)
+        self.canvas.delete("loading")
+        if not self.image:
+            self.canvas.create_text(10, 10, anchor="nw", text=f"Loading {description}...", fill="gray", tags="loading")
+
+    def hide_loading(self):
+        self.loading_label.config(text="")
+        self.loading_bar.stop()
+        self.loading_bar.pack_forget()
+        self.canvas.delete("loading")
 
     def on_tab_changed(self, event):
         selected_tab = self.notebook.index(self.notebook.select())
         if selected_tab == 0:
-            self.setup_editor_tab()
+            self.refresh_editor_tab()
         elif selected_tab == 1:
             # Only populate the tree if it hasn't been set up
             if not hasattr(self, 'textures_setup_done') or not self.textures_setup_done:
                 self.setup_textures_tab()
-        else:
-            self.show_image_combiner(self.combiner_var.get())
+        # Image Combiner tabs are built by show_image_combiner and kept as they are
+
+    def refresh_editor_tab(self):
+        # Redraw only if the image changed while the tab was hidden
+        if self.canvas_stale:
+            self.update_canvas()
 
     def show_image_combiner(self, num_images_str):
         num_images = int(num_images_str.split()[0])
@@ -314,10 +2800,6 @@ class MinecraftTextureEditor:
         self.notebook.add(combiner_frame, text=f"Image Combiner ({num_images})")
         self.notebook.select(combiner_frame)
 
-        if self.update_canvas_id is not None:
-            self.root.after_cancel(self.update_canvas_id)
-            self.update_canvas_id = None
-
         self.overlay_mode = False
         self.first_image_pos = [140, 140]
         self.first_image_size = [280, 280]
@@ -371,7 +2853,7 @@ class MinecraftTextureEditor:
                 try:
                     if canvas.winfo_exists():  # Ensure canvas still exists
                         canvas.drop_target_register(DND_FILES)
-                        canvas.dnd_bind('<<Drop>>', lambda event, idx=idx, c=canvas: self.handle_drop(event, self.image_paths[idx], c))
+                        canvas.dnd_bind('<<Drop>>', lambda event, idx=idx: self.handle_drop(event, idx))
                     else:
                         print(f"Canvas for Image {idx+1} no longer exists during drop_target_register.")
                 except Exception as e:
@@ -423,86 +2905,109 @@ class MinecraftTextureEditor:
 
         tk.Label(self.sidebar_frame, text="Select Pattern:", bg="#252525", fg="white", font=("Arial", 10)).pack(pady=5)
 
-        if num_images == 2:
-            patterns = [
-                "Horizontal Split", "Horizontal Split (Reverse)",
-                "Vertical Split", "Vertical Split (Reverse)",
-                "Checkerboard", "Checkerboard (Reverse)",
-                "Per Bend", "Per Bend (Reverse)",
-                "Cross", "Cross (Reverse)",
-                "Chevron", "Chevron (Reverse)",
-                "Inverted Chevron", "Inverted Chevron (Reverse)",
-                "Stripes Horizontal", "Stripes Vertical",
-                "Border", "Border (Reverse)",
-                "Diamond", "Diamond (Reverse)"
-            ]
-            self.pattern_var.set("Horizontal Split")
-        else:
-            patterns = [
-                f"Split {num_images} Horizontal",
-                f"Split {num_images} Vertical",
-                f"Checkerboard {num_images}",
-                f"Stripes Horizontal {num_images}",
-                f"Stripes Vertical {num_images}",
-                f"Gradient {num_images}",
-                f"Border Cycle {num_images}",
-                f"Diamond Cycle {num_images}"
-            ]
-            self.pattern_var.set(patterns[0])
+        patterns = list(self.available_patterns(num_images))
+        self.pattern_var.set(patterns[0])
 
         self.pattern_menu = tk.OptionMenu(self.sidebar_frame, self.pattern_var, *patterns)
         self.pattern_menu.config(bg="#3a3a3a", fg="white", highlightthickness=0)
         self.pattern_menu.pack(pady=5, fill="x", padx=10)
 
-    def handle_drop(self, event, path_var, canvas):
+        # Custom pattern formulas (see TWO_IMAGE_PATTERNS for the syntax)
+        tk.Label(self.sidebar_frame, text="Custom Pattern Name:", bg="#252525", fg="white").pack(pady=(10, 0))
+        self.custom_pattern_name_entry = tk.Entry(self.sidebar_frame, bg="#3a3a3a", fg="white", insertbackground="white")
+        self.custom_pattern_name_entry.pack(fill="x", padx=10)
+        tk.Label(self.sidebar_frame, text="Formula:", bg="#252525", fg="white").pack()
+        self.custom_pattern_entry = tk.Entry(self.sidebar_frame, bg="#3a3a3a", fg="white", insertbackground="white")
+        self.custom_pattern_entry.insert(0, "abs(x - cx) + abs(y - cy) < s")
+        self.custom_pattern_entry.pack(fill="x", padx=10)
+        tk.Button(self.sidebar_frame, text="Add Pattern", command=self.add_custom_pattern, bg="#3a3a3a", fg="white").pack(pady=5)
+
+    def available_patterns(self, num_images):
+        self.load_custom_patterns()
+        patterns = builtin_patterns(num_images)
+        patterns.update(self.custom_patterns)
+        return patterns
+
+    def add_custom_pattern(self):
+        name = self.custom_pattern_name_entry.get().strip()
+        formula = self.custom_pattern_entry.get().strip()
+        if not name or not formula:
+            messagebox.showerror("Error", "Enter a name and a formula for the pattern.")
+            return
         try:
-            file_path = event.data
-            if file_path.startswith("{") and file_path.endswith("}"):
-                file_path = file_path[1:-1]
+            pattern_geometry(formula, 16, 16, self.num_images)
+        except Exception as e:
+            messagebox.showerror("Error", f"Invalid pattern: {str(e)}")
+            return
+        self.custom_patterns[name] = formula
+        self.save_custom_patterns()
+        self.update_pattern_options(self.num_images)
+        self.pattern_var.set(name)
+        self.status_label.config(text=f"Pattern '{name}' added")
+
+    def dropped_paths(self, event):
+        # Drop payloads are Tcl lists: several paths, those with spaces in braces
+        paths = self.root.tk.splitlist(event.data)
+        valid = []
+        for file_path in paths:
             if not os.path.exists(file_path):
-                self.status_label.config(text=f"Error: File not found: {file_path}")
                 print(f"Drop error: File not found: {file_path}")
-                return
-            if not file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                self.status_label.config(text="Error: Only PNG/JPG files are supported")
+            elif not file_path.lower().endswith(IMAGE_EXTENSIONS):
                 print(f"Drop error: Unsupported file type: {file_path}")
-                return
-            path_var.set(file_path)
-            image = Image.open(file_path).convert("RGBA")
-            canvas_width = canvas.winfo_width()
-            canvas_height = canvas.winfo_height()
-            img_width, img_height = image.size
-            scale = min(canvas_width / img_width, canvas_height / img_height)
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            image = image.resize((new_width, new_height), Image.NEAREST)
-            tk_image = ImageTk.PhotoImage(image)
-            canvas.delete("all")
-            canvas.create_image(canvas_width//2, canvas_height//2, anchor="center", image=tk_image)
-            canvas.image = tk_image
-            self.status_label.config(text="Image uploaded successfully")
-        except Exception as e:
-            self.status_label.config(text="Error uploading image")
-            print(f"Error in handle_drop: {str(e)}")
+            else:
+                valid.append(file_path)
+        return valid, len(paths) - len(valid)
+
+    def handle_drop(self, event, idx):
+        file_paths, skipped = self.dropped_paths(event)
+        if not file_paths:
+            self.status_label.config(text="Error: Only existing PNG/JPG files are supported")
+            return
+        self.fill_combiner_slots(file_paths, idx, skipped)
+
+    def fill_combiner_slots(self, file_paths, first_slot=0, skipped=0):
+        # Fill the slots from first_slot onwards, decoding all files at once;
+        # files beyond the last slot are skipped
+        skipped += max(0, len(file_paths) - (self.num_images - first_slot))
+        file_paths = file_paths[:self.num_images - first_slot]
+        status_label = self.status_label
+        status_label.config(text=f"Loading {len(file_paths)} image(s)...")
+
+        def loaded(images):
+            failed = skipped
+            for slot, (file_path, image) in enumerate(zip(file_paths, images), first_slot):
+                if isinstance(image, Exception):
+                    print(f"Error loading {file_path}: {str(image)}")
+                    failed += 1
+                    continue
+                self.image_paths[slot].set(file_path)
+                self.show_slot_image(self.image_canvases[slot], image)
+            uploaded = len(file_paths) + skipped - failed
+            status_label.config(text=f"{uploaded} image(s) uploaded" + (f", {failed} skipped" if failed else ""))
+
+        self.load_image_async(lambda: open_images(file_paths), loaded, None, target="combiner")
 
     def upload_image(self, path_var, canvas):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg")])
         if file_path:
             path_var.set(file_path)
-            image = Image.open(file_path).convert("RGBA")
-            canvas_width = canvas.winfo_width()
-            canvas_height = canvas.winfo_height()
-            img_width, img_height = image.size
-            scale = min(canvas_width / img_width, canvas_height / img_height)
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            image = image.resize((new_width, new_height), Image.NEAREST)
-            tk_image = ImageTk.PhotoImage(image)
-            canvas.delete("all")
-            canvas.create_image(canvas_width//2, canvas_height//2, anchor="center", image=tk_image)
-            canvas.image = tk_image
+            self.show_slot_image(canvas, Image.open(file_path).convert("RGBA"))
             self.status_label.config(text="Image uploaded successfully")
 
+    def show_slot_image(self, canvas, image):
+        # Slot canvases may not be laid out yet right after the tab is built
+        canvas_width = int(canvas["width"])
+        canvas_height = int(canvas["height"])
+        img_width, img_height = image.size
+        scale = min(canvas_width / img_width, canvas_height / img_height)
+        new_width = int(img_width * scale)
+        new_height = int(img_height * scale)
+        image = image.resize((new_width, new_height), Image.NEAREST)
+        tk_image = ImageTk.PhotoImage(image)
+        canvas.delete("all")
+        canvas.create_image(canvas_width//2, canvas_height//2, anchor="center", image=tk_image)
+        canvas.image = tk_image
+
     def toggle_sidebar(self):
         if self.sidebar_visible:
             self.sidebar_frame.pack_forget()
@@ -545,282 +3050,8 @@ class MinecraftTextureEditor:
         pattern = self.pattern_var.get()
 
         try:
-            for i in range(self.num_images):
-                self.images[i] = self.images[i].resize((output_width, output_height), Image.NEAREST)
-
-            self.combined_image = Image.new("RGBA", (output_width, output_height))
-
-            if self.num_images == 2:
-                if pattern == "Horizontal Split":
-                    half_width = output_width // 2
-                    left_half = self.images[0].crop((0, 0, half_width, output_height))
-                    right_half = self.images[1].crop((half_width, 0, output_width, output_height))
-                    self.combined_image.paste(left_half, (0, 0))
-                    self.combined_image.paste(right_half, (half_width, 0))
-                elif pattern == "Horizontal Split (Reverse)":
-                    half_width = output_width // 2
-                    left_half = self.images[1].crop((0, 0, half_width, output_height))
-                    right_half = self.images[0].crop((half_width, 0, output_width, output_height))
-                    self.combined_image.paste(left_half, (0, 0))
-                    self.combined_image.paste(right_half, (half_width, 0))
-                elif pattern == "Vertical Split":
-                    half_height = output_height // 2
-                    top_half = self.images[0].crop((0, 0, output_width, half_height))
-                    bottom_half = self.images[1].crop((0, half_height, output_width, output_height))
-                    self.combined_image.paste(top_half, (0, 0))
-                    self.combined_image.paste(bottom_half, (0, half_height))
-                elif pattern == "Vertical Split (Reverse)":
-                    half_height = output_height // 2
-                    top_half = self.images[1].crop((0, 0, output_width, half_height))
-                    bottom_half = self.images[0].crop((0, half_height, output_width, output_height))
-                    self.combined_image.paste(top_half, (0, 0))
-                    self.combined_image.paste(bottom_half, (0, half_height))
-                elif pattern == "Checkerboard":
-                    half_width = output_width // 2
-                    half_height = output_height // 2
-                    self.combined_image.paste(self.images[0].crop((0, 0, half_width, half_height)), (0, 0))
-                    self.combined_image.paste(self.images[1].crop((half_width, 0, output_width, half_height)), (half_width, 0))
-                    self.combined_image.paste(self.images[1].crop((0, half_height, half_width, output_height)), (0, half_height))
-                    self.combined_image.paste(self.images[0].crop((half_width, half_height, output_width, output_height)), (half_width, half_height))
-                elif pattern == "Checkerboard (Reverse)":
-                    half_width = output_width // 2
-                    half_height = output_height // 2
-                    self.combined_image.paste(self.images[1].crop((0, 0, half_width, half_height)), (0, 0))
-                    self.combined_image.paste(self.images[0].crop((half_width, 0, output_width, half_height)), (half_width, 0))
-                    self.combined_image.paste(self.images[0].crop((0, half_height, half_width, output_height)), (0, half_height))
-                    self.combined_image.paste(self.images[1].crop((half_width, half_height, output_width, output_height)), (half_width, half_height))
-                elif pattern == "Per Bend":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y < (output_height * x) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                elif pattern == "Per Bend (Reverse)":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y < (output_height * (output_width - 1 - x)) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                elif pattern == "Cross":
-                    cross_thickness = max(1, output_width // 5)
-                    center_x = (output_width - 1) / 2
-                    center_y = (output_height - 1) / 2
-                    half_thickness = cross_thickness / 2
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            in_cross = (
-                                (center_x - half_thickness <= x <= center_x + half_thickness) or
-                                (center_y - half_thickness <= y <= center_y + half_thickness)
-                            )
-                            if in_cross:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Cross (Reverse)":
-                    cross_thickness = max(1, output_width // 5)
-                    center_x = (output_width - 1) / 2
-                    center_y = (output_height - 1) / 2
-                    half_thickness = cross_thickness / 2
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            in_cross = (
-                                (center_x - half_thickness <= x <= center_x + half_thickness) or
-                                (center_y - half_thickness <= y <= center_y + half_thickness)
-                            )
-                            if in_cross:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                elif pattern == "Chevron":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y < (output_height * x) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Chevron (Reverse)":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y < (output_height * (output_width - 1 - x)) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Inverted Chevron":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y > (output_height * x) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Inverted Chevron (Reverse)":
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if y > (output_height * (output_width - 1 - x)) // output_width:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Stripes Horizontal":
-                    stripe_height = max(1, output_height // 4)
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if (y // stripe_height) % 2 == 0:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Stripes Vertical":
-                    stripe_width = max(1, output_width // 4)
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            if (x // stripe_width) % 2 == 0:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Border":
-                    border_width = max(1, output_width // 8)
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            is_border = (
-                                x < border_width or
-                                x >= output_width - border_width or
-                                y < border_width or
-                                y >= output_height - border_width
-                            )
-                            if is_border:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Border (Reverse)":
-                    border_width = max(1, output_width // 8)
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            is_border = (
-                                x < border_width or
-                                x >= output_width - border_width or
-                                y < border_width or
-                                y >= output_height - border_width
-                            )
-                            if is_border:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                elif pattern == "Diamond":
-                    center_x = (output_width - 1) / 2
-                    center_y = (output_height - 1) / 2
-                    diamond_size = min(output_width, output_height) / 2
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            dist = abs(x - center_x) + abs(y - center_y)
-                            if dist < diamond_size:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                elif pattern == "Diamond (Reverse)":
-                    center_x = (output_width - 1) / 2
-                    center_y = (output_height - 1) / 2
-                    diamond_size = min(output_width, output_height) / 2
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            dist = abs(x - center_x) + abs(y - center_y)
-                            if dist < diamond_size:
-                                self.combined_image.putpixel((x, y), self.images[1].getpixel((x, y)))
-                            else:
-                                self.combined_image.putpixel((x, y), self.images[0].getpixel((x, y)))
-
-            else:
-                if f"Split {self.num_images} Horizontal" in pattern:
-                    section_width = output_width // self.num_images
-                    remaining_width = output_width % self.num_images
-                    for i in range(self.num_images):
-                        start_x = i * section_width + min(i, remaining_width)
-                        current_section_width = section_width + (1 if i < remaining_width else 0)
-                        end_x = start_x + current_section_width
-                        if end_x > output_width:
-                            end_x = output_width
-                            current_section_width = end_x - start_x
-                        self.combined_image.paste(
-                            self.images[i].crop((start_x, 0, end_x, output_height)),
-                            (start_x, 0)
-                        )
-                elif f"Split {self.num_images} Vertical" in pattern:
-                    section_height = output_height // self.num_images
-                    remaining_height = output_height % self.num_images
-                    for i in range(self.num_images):
-                        start_y = i * section_height + min(i, remaining_height)
-                        current_section_height = section_height + (1 if i < remaining_height else 0)
-                        end_y = start_y + current_section_height
-                        if end_y > output_height:
-                            end_y = output_height
-                            current_section_height = end_y - start_y
-                        self.combined_image.paste(
-                            self.images[i].crop((0, start_y, output_width, end_y)),
-                            (0, start_y)
-                        )
-                elif f"Checkerboard {self.num_images}" in pattern:
-                    rows = int(self.num_images ** 0.5)
-                    cols = (self.num_images + rows - 1) // rows
-                    cell_width = output_width // cols
-                    cell_height = output_height // rows
-                    remaining_width = output_width % cols
-                    remaining_height = output_height % rows
-                    for row in range(rows):
-                        for col in range(cols):
-                            idx = row * cols + col
-                            if idx >= self.num_images:
-                                idx = idx % self.num_images
-                            start_x = col * cell_width + min(col, remaining_width)
-                            start_y = row * cell_height + min(row, remaining_height)
-                            current_cell_width = cell_width + (1 if col < remaining_width else 0)
-                            current_cell_height = cell_height + (1 if row < remaining_height else 0)
-                            end_x = start_x + current_cell_width
-                            end_y = start_y + current_cell_height
-                            if end_x > output_width:
-                                end_x = output_width
-                                current_cell_width = end_x - start_x
-                            if end_y > output_height:
-                                end_y = output_height
-                                current_cell_height = end_y - start_y
-                            self.combined_image.paste(
-                                self.images[idx].crop((0, 0, current_cell_width, current_cell_height)),
-                                (start_x, start_y)
-                            )
-                elif f"Stripes Horizontal {self.num_images}" in pattern:
-                    stripe_height = max(1, output_height // self.num_images)
-                    for y in range(output_height):
-                        img_idx = (y // stripe_height) % self.num_images
-                        for x in range(output_width):
-                            self.combined_image.putpixel((x, y), self.images[img_idx].getpixel((x, y)))
-                elif f"Stripes Vertical {self.num_images}" in pattern:
-                    stripe_width = max(1, output_width // self.num_images)
-                    for x in range(output_width):
-                        img_idx = (x // stripe_width) % self.num_images
-                        for y in range(output_height):
-                            self.combined_image.putpixel((x, y), self.images[img_idx].getpixel((x, y)))
-                elif f"Gradient {self.num_images}" in pattern:
-                    for y in range(output_height):
-                        t = (y * self.num_images) // output_height
-                        if t >= self.num_images:
-                            t = self.num_images - 1
-                        for x in range(output_width):
-                            self.combined_image.putpixel((x, y), self.images[t].getpixel((x, y)))
-                elif f"Border Cycle {self.num_images}" in pattern:
-                    border_width = max(1, output_width // 8)
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            dist = min(x, y, output_width - 1 - x, output_height - 1 - y)
-                            idx = (dist // border_width) % self.num_images
-                            self.combined_image.putpixel((x, y), self.images[idx].getpixel((x, y)))
-                elif f"Diamond Cycle {self.num_images}" in pattern:
-                    center_x = (output_width - 1) / 2
-                    center_y = (output_height - 1) / 2
-                    max_dist = min(output_width, output_height) / 2
-                    for x in range(output_width):
-                        for y in range(output_height):
-                            dist = abs(x - center_x) + abs(y - center_y)
-                            idx = int((dist * self.num_images) / max_dist) % self.num_images
-                            self.combined_image.putpixel((x, y), self.images[idx].getpixel((x, y)))
-
+            formula = self.available_patterns(self.num_images)[pattern]
+            self.combined_image = combine_pattern(self.images, formula, (output_width, output_height))
             self.display_combined_image()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to combine images: {str(e)}")
@@ -1080,20 +3311,7 @@ class MinecraftTextureEditor:
         if file_path:
             try:
                 if self.overlay_mode:
-                    first_image = self.images[0].copy()
-                    second_image = self.images[1].copy()
-                    output_width = self.combined_canvas.winfo_width()
-                    output_height = self.combined_canvas.winfo_height()
-                    first_image = first_image.resize((self.first_image_size[0], self.first_image_size[1]), Image.NEAREST)
-                    second_image = second_image.resize((self.second_image_size[0], self.second_image_size[1]), Image.NEAREST)
-                    combined = Image.new("RGBA", (output_width, output_height))
-                    first_pos_x = self.first_image_pos[0] - self.first_image_size[0] // 2
-                    first_pos_y = self.first_image_pos[1] - self.first_image_size[1] // 2
-                    second_pos_x = self.second_image_pos[0] - self.second_image_size[0] // 2
-                    second_pos_y = self.second_image_pos[1] - self.second_image_size[1] // 2
-                    combined.paste(first_image, (int(first_pos_x), int(first_pos_y)), first_image)
-                    combined.paste(second_image, (int(second_pos_x), int(second_pos_y)), second_image)
-                    combined.save(file_path)
+                    self.compose_overlay()().save(file_path)
                 else:
                     self.combined_image.save(file_path)
                 self.status_label.config(text="Combined image exported successfully")
@@ -1107,50 +3325,72 @@ class MinecraftTextureEditor:
             self.status_label.config(text="Error: No combined image")
             return
 
-        if self.overlay_mode:
-            first_image = self.images[0].copy()
-            second_image = self.images[1].copy()
-            output_width = self.combined_canvas.winfo_width()
-            output_height = self.combined_canvas.winfo_height()
-            first_image = first_image.resize((self.first_image_size[0], self.first_image_size[1]), Image.NEAREST)
-            second_image = second_image.resize((self.second_image_size[0], self.second_image_size[1]), Image.NEAREST)
-            self.combined_image = Image.new("RGBA", (output_width, output_height))
-            first_pos_x = self.first_image_pos[0] - self.first_image_size[0] // 2
-            first_pos_y = self.first_image_pos[1] - self.first_image_size[1] // 2
-            second_pos_x = self.second_image_pos[0] - self.second_image_size[0] // 2
-            second_pos_y = self.second_image_pos[1] - self.second_image_size[1] // 2
-            self.combined_image.paste(first_image, (int(first_pos_x), int(first_pos_y)), first_image)
-            self.combined_image.paste(second_image, (int(second_pos_x), int(second_pos_y)), second_image)
-
-        self.image = self.combined_image.copy()
-        self.undo_stack = [self.image.copy()]
-        self.redo_stack = []
-        self.update_undo_redo_buttons()
-        self.update_canvas()
+        status_label = self.status_label
+        overlay_mode = self.overlay_mode
+
+        def loaded(image):
+            if overlay_mode:
+                self.combined_image = image.copy()
+            self.open_in_editor(image, "Combined image")
+            status_label.config(text="Combined image loaded into editor")
+
+        # The editor paints into its image, so it gets its own copy made off the Tk thread
+        source = self.compose_overlay() if overlay_mode else self.combined_image.copy
         self.notebook.select(self.editor_frame)
-        self.status_label.config(text="Combined image loaded into editor")
+        self.load_image_async(source, loaded, "combined image")
+
+    def compose_overlay(self):
+        # Capture the overlay layout on the Tk thread and return a function that
+        # composes it, so the resizing and pasting can run on a worker thread
+        output_size = (self.combined_canvas.winfo_width(), self.combined_canvas.winfo_height())
+        layers = [
+            (self.images[0], tuple(self.first_image_size), tuple(self.first_image_pos)),
+            (self.images[1], tuple(self.second_image_size), tuple(self.second_image_pos)),
+        ]
+
+        def compose():
+            combined = Image.new("RGBA", output_size)
+            for image, size, pos in layers:
+                image = image.resize(size, Image.NEAREST)
+                combined.paste(image, (int(pos[0] - size[0] // 2), int(pos[1] - size[1] // 2)), image)
+            return combined
+
+        return compose
 
     def on_drop(self, event):
-        file_path = event.data
-        if file_path.startswith("{") and file_path.endswith("}"):
-            file_path = file_path[1:-1]
-        if not os.path.exists(file_path):
-            messagebox.showerror("Error", f"File not found: {file_path}")
-            return
-        if not file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-            messagebox.showerror("Error", "Only PNG/JPG files are supported")
+        file_paths, skipped = self.dropped_paths(event)
+        if not file_paths:
+            messagebox.showerror("Error", "Only existing PNG/JPG files are supported")
             return
-        try:
-            self.image = Image.open(file_path).convert("RGBA")
-            self.undo_stack = [self.image.copy()]
-            self.redo_stack = []
-            self.update_undo_redo_buttons()
-            self.update_canvas()
+        selected = self.notebook.tab(self.notebook.select(), "text")
+        if selected.startswith("Image Combiner"):
+            self.fill_combiner_slots(file_paths, 0, skipped)
+        elif len(file_paths) == 1:
+            self.open_file_async(file_paths[0])
+        else:
+            # Several files open as documents, the last one dropped is shown
             self.notebook.select(self.editor_frame)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load image: {str(e)}")
+            self.load_image_async(lambda: open_images(file_paths), lambda images: self.open_documents(file_paths, images), f"{len(file_paths)} images")
+
+    def open_documents(self, file_paths, images):
+        failed = []
+        opened = None
+        for file_path, image in zip(file_paths, images):
+            if isinstance(image, Exception):
+                failed.append(f"{os.path.basename(file_path)}: {str(image)}")
+            else:
+                animation = read_animation(file_path, image.width, image.height)
+                opened = self.add_document(image, os.path.basename(file_path), file_path, animation=animation)
+        if opened is not None:
+            self.activate_document(opened)
+        if failed:
+            messagebox.showerror("Error", "Failed to load images:\n" + "\n".join(failed))
 
     def load_projects(self):
+        # Projects are loaded on first use rather than at startup
+        if self.projects is not None:
+            return
+        self.projects = {}
         projects_file = os.path.join(INSTALL_DIR, "projects.pkl")
         if os.path.exists(projects_file):
             try:
@@ -1166,6 +3406,25 @@ class MinecraftTextureEditor:
         with open(projects_file, "wb") as f:
             pickle.dump(self.projects, f)
 
+    def load_custom_patterns(self):
+        if self.custom_patterns is not None:
+            return
+        self.custom_patterns = {}
+        patterns_file = os.path.join(INSTALL_DIR, "patterns.pkl")
+        if os.path.exists(patterns_file):
+            try:
+                with open(patterns_file, "rb") as f:
+                    self.custom_patterns = pickle.load(f)
+            except:
+                self.custom_patterns = {}
+
+    def save_custom_patterns(self):
+        if not os.path.exists(INSTALL_DIR):
+            os.makedirs(INSTALL_DIR)
+        patterns_file = os.path.join(INSTALL_DIR, "patterns.pkl")
+        with open(patterns_file, "wb") as f:
+            pickle.dump(self.custom_patterns, f)
+
     def new_project(self):
         size_dialog = tk.Toplevel(self.root)
         size_dialog.title("New Project")
@@ -1187,11 +3446,7 @@ class MinecraftTextureEditor:
                 height = int(height_entry.get())
                 if width <= 0 or height <= 0:
                     raise ValueError("Dimensions must be positive integers.")
-                self.image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-                self.undo_stack = [self.image.copy()]
-                self.redo_stack = []
-                self.update_undo_redo_buttons()
-                self.update_canvas()
+                self.open_in_editor(PixelBuffer.blank(width, height))
                 size_dialog.destroy()
             except ValueError as e:
                 messagebox.showerror("Error", str(e))
@@ -1201,11 +3456,7 @@ class MinecraftTextureEditor:
     def import_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg")])
         if file_path:
-            self.image = Image.open(file_path).convert("RGBA")
-            self.undo_stack = [self.image], self.redo_stack = []
-            self.update_undo_redo_buttons()
-            self.update_canvas_id = self.root.after(100, self.update_canvas)
-            self.notebook.select(self.editor_frame)
+            self.open_file_async(file_path)
 
     def export_image(self):
         if not self.image:
@@ -1213,9 +3464,119 @@ class MinecraftTextureEditor:
             return
         file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG files", "*.png")])
         if file_path:
-            self.image.save(file_path)
+            image = self.document_image().to_image()
+            if file_path.lower().endswith(".png"):
+                with open(file_path, "wb") as f:
+                    f.write(optimize_png(image))
+            else:
+                image.save(file_path)
+            self.note_file_stamp(file_path)
             messagebox.showinfo("Success", "Image exported successfully.")
 
+    def export_pack(self):
+        # Every open document, and optionally every saved project, into one resource pack zip
+        self.store_active_document()
+        self.load_projects()
+        include_projects = bool(self.projects) and messagebox.askyesno("Export Pack", f"Also include the {len(self.projects)} saved project(s)?")
+        if not self.documents and not include_projects:
+            messagebox.showerror("Error", "No open documents or projects to export.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".zip", filetypes=[("Resource packs", "*.zip")])
+        if not file_path:
+            return
+        # Optionally leave out textures identical to a vanilla texture zip
+        vanilla_path = None
+        if messagebox.askyesno("Export Pack", "Only include textures that differ from vanilla?"):
+            vanilla_path = filedialog.askopenfilename(title="Vanilla textures zip", filetypes=[("Zip files", "*.zip")])
+            if not vanilla_path:
+                return
+
+        # (pack path, image, name shown to the user, .mcmeta to copy along)
+        entries = []
+        if include_projects:
+            for project_name, project_data in self.projects.items():
+                entries.append((pack_texture_path(project_name), project_data["image"], f"Project {project_name}", None))
+        for document in self.documents:
+            meta_path = document["path"] + ".mcmeta" if document["animation"] and document["path"] else None
+            entries.append((pack_texture_path(document["path"] or document["name"]), self.document_buffer(document).to_image(), document["name"], meta_path))
+
+        # Textures mapping to the same pack path (every unsaved "Untitled", say) get numbered names
+        textures, mcmeta, renamed = {}, {}, []
+        for pack_path, image, name, meta_path in entries:
+            unique, number = pack_path, 2
+            while unique in textures:
+                unique, number = f"{pack_path[:-len('.png')]}_{number}.png", number + 1
+            if unique != pack_path:
+                renamed.append(f"{name} -> {unique[len(PACK_TEXTURES):]}")
+            textures[unique] = image
+            if meta_path:
+                mcmeta[unique] = meta_path
+        if renamed and not messagebox.askokcancel("Export Pack", "These textures share a name with another one in the pack and will be renamed:\n\n"
+                                                  + "\n".join(renamed[:20]) + (f"\n... and {len(renamed) - 20} more" if len(renamed) > 20 else "")):
+            return
+
+        def export():
+            vanilla = vanilla_index(vanilla_path) if vanilla_path else None
+            count = export_resource_pack(textures.items(), file_path, vanilla=vanilla)
+            # Animation metadata of edited animated textures goes along with them
+            with zipfile.ZipFile(file_path, "a") as archive:
+                written = set(archive.namelist())
+                for pack_path, meta_path in mcmeta.items():
+                    if pack_path in written and os.path.exists(meta_path):
+                        archive.write(meta_path, pack_path + ".mcmeta")
+            return count
+
+        self.load_image_async(export, lambda count: messagebox.showinfo("Success", f"Exported {count} texture(s) to {os.path.basename(file_path)}."),
+                              None, target="export", on_error=lambda e: messagebox.showerror("Error", f"Failed to export pack: {str(e)}"))
+
+    def find_similar(self):
+        # List indexed textures whose perceptual hash is near the current image's
+        if not self.image:
+            messagebox.showerror("Error", "No image to compare.")
+            return
+        value = texture_hash(self.image.to_image())
+
+        def search():
+            return texture_hash_index().query(value, SIMILAR_DISTANCE)
+
+        self.load_image_async(search, self.show_similar, "Indexing textures", target="similar",
+                              on_error=lambda e: messagebox.showerror("Error", f"Failed to index textures: {str(e)}"))
+
+    def show_similar(self, results):
+        similar_window = tk.Toplevel(self.root)
+        similar_window.title("Similar Textures")
+        similar_window.configure(bg="#1a1a1a")
+        if not results:
+            tk.Label(similar_window, text="No similar textures found.", bg="#1a1a1a", fg="white").pack(padx=10, pady=10)
+            return
+        listbox = tk.Listbox(similar_window, bg="#3a3a3a", fg="white", selectbackground="#4CAF50", width=100, height=20)
+        listbox.pack(padx=10, pady=10, fill="both", expand=True)
+        for distance, key in results:
+            listbox.insert(tk.END, f"{distance:3d}  {key}")
+
+        def open_selected(event=None):
+            selected = listbox.curselection()
+            if not selected:
+                return
+            key = results[selected[0]][1]
+            source = read_texture_key(key)
+            if isinstance(source, str):
+                self.open_file_async(source)
+            else:
+                self.notebook.select(self.editor_frame)
+                name = os.path.basename(key)
+                self.load_image_async(lambda: Image.open(io.BytesIO(source)).convert("RGBA"), lambda image: self.open_in_editor(image, name), name)
+
+        listbox.bind("<Double-Button-1>", open_selected)
+        tk.Button(similar_window, text="Open", command=open_selected, bg="#3a3a3a", fg="white").pack(pady=5)
+
+    def document_buffer(self, document):
+        # A document's image without activating it (read from its spill file if spilled)
+        if not document["spill_file"]:
+            return document["image"]
+        with open(document["spill_file"], "rb") as f:
+            return unpack_buffer(pickle.load(f)["image"])
+
     def save_project(self):
         if not self.image:
             messagebox.showerror("Error", "No image to save.")
@@ -1223,8 +3584,9 @@ class MinecraftTextureEditor:
 
         project_name = tk.simpledialog.askstring("Save Project", "Enter project name:", parent=self.root)
         if project_name:
+            self.load_projects()
             project_data = {
-                "image": self.image.copy(),
+                "image": self.document_image().to_image(),
                 "undo_stack": self.undo_stack.copy(),
                 "redo_stack": self.redo_stack.copy()
             }
@@ -1240,6 +3602,7 @@ class MinecraftTextureEditor:
         listbox = tk.Listbox(projects_window, bg="#3a3a3a", fg="white", selectbackground="#4CAF50")
         listbox.pack(padx=10, pady=10, fill="both", expand=True)
 
+        self.load_projects()
         for project_name in self.projects.keys():
             listbox.insert(tk.END, project_name)
 
@@ -1251,12 +3614,13 @@ class MinecraftTextureEditor:
             project_name = listbox.get(selected[0])
             project_data = self.projects.get(project_name)
             if project_data:
-                self.image = project_data["image"].copy()
-                self.undo_stack = project_data["undo_stack"].copy()
-                self.redo_stack = project_data["redo_stack"].copy()
-                self.update_undo_redo_buttons()
-                self.update_canvas()
-                self.notebook.select(self.editor_frame)
+                undo_stack = project_data["undo_stack"].copy()
+                redo_stack = project_data["redo_stack"].copy()
+                # Projects saved before region history held whole-image snapshots
+                if any(isinstance(entry, Image.Image) for entry in undo_stack + redo_stack):
+                    undo_stack, redo_stack = [], []
+                undo_stack, redo_stack = history_arrays(undo_stack), history_arrays(redo_stack)
+                self.open_in_editor(project_data["image"].copy(), project_name, None, undo_stack, redo_stack)
                 projects_window.destroy()
 
         def delete_project():
@@ -1275,41 +3639,72 @@ class MinecraftTextureEditor:
         tk.Button(projects_window, text="Delete", command=delete_project, bg="#f44336", fg="white").pack(side="left", padx=5, pady=5)
         tk.Button(projects_window, text="Close", command=projects_window.destroy, bg="#3a3a3a", fg="white").pack(side="right", padx=5, pady=5)
 
+    def push_history(self, box, before, after=None):
+        # History entries hold only the changed box: (box, pixels before, pixels after),
+        # so before (and after, if given) must already be cropped to box
+        if after is None:
+            after = self.image.crop(box)
+        # Entries are kept in whole-image coordinates, so for an animated texture
+        # they name the frame they belong to
+        top = self.frame_top()
+        box = (box[0], box[1] + top, box[2], box[3] + top)
+        self.frame_cache.pop(self.animation["frame"] if self.animation else None, None)
+        self.undo_stack.append((box, before, after))
+        self.redo_stack = []
+        self.update_undo_redo_buttons()
+        self.journal("edit", box, pack_pixels(before), pack_pixels(after))
+
     def undo(self):
-        if len(self.undo_stack) > 1:
-            self.redo_stack.append(self.undo_stack.pop())
-            self.image = self.undo_stack[-1].copy()
+        if self.undo_stack:
+            box, before, after = self.undo_stack.pop()
+            self.redo_stack.append((box, before, after))
+            self.paste_history(box, before)
+            self.journal("undo")
             self.update_undo_redo_buttons()
             self.update_canvas()
 
     def redo(self):
         if self.redo_stack:
-            self.undo_stack.append(self.redo_stack.pop())
-            self.image = self.undo_stack[-1].copy()
+            box, before, after = self.redo_stack.pop()
+            self.undo_stack.append((box, before, after))
+            self.paste_history(box, after)
+            self.journal("redo")
             self.update_undo_redo_buttons()
             self.update_canvas()
 
+    def paste_history(self, box, pixels):
+        # Undo/redo of an animated texture first switches to the entry's frame
+        if self.animation:
+            frame = box[1] // self.animation["frame_height"]
+            if frame != self.animation["frame"]:
+                self.show_frame(frame)
+            self.frame_cache.pop(frame, None)
+        self.image.paste(pixels, (box[0], box[1] - self.frame_top()))
+
     def update_undo_redo_buttons(self):
-        self.undo_btn.config(state="normal" if len(self.undo_stack) > 1 else "disabled")
+        self.undo_btn.config(state="normal" if self.undo_stack else "disabled")
         self.redo_btn.config(state="normal" if self.redo_stack else "disabled")
 
     def set_tool(self, tool):
         self.current_tool = tool
-        for btn in self.tools_frame.winfo_children():
-            btn.config(bg="#3a3a3a")
-        if tool == "paint":
-            self.tools_frame.winfo_children()[0].config(bg="#5a5a5a")
-        elif tool == "erase":
-            self.tools_frame.winfo_children()[1].config(bg="#5a5a5a")
-        elif tool == "eyedropper":
-            self.tools_frame.winfo_children()[2].config(bg="#5a5a5a")
-        elif tool == "bucket":
-            self.tools_frame.winfo_children()[3].config(bg="#5a5a5a")
+        for name, btn in self.tool_buttons.items():
+            btn.config(bg="#5a5a5a" if name == tool else "#3a3a3a")
 
     def toggle_grid(self):
         self.show_grid = not self.show_grid
         self.update_canvas()
 
+    def update_brush_size(self, event=None):
+        try:
+            size = int(self.brush_size_spinbox.get())
+            if not 1 <= size <= 64:
+                raise ValueError
+            self.brush_size = size
+        except ValueError:
+            messagebox.showerror("Error", "Brush size must be an integer from 1 to 64.")
+            self.brush_size_spinbox.delete(0, tk.END)
+            self.brush_size_spinbox.insert(0, str(self.brush_size))
+
     def update_grid_size(self, event=None):
         try:
             new_grid_size_x = int(self.grid_size_x_entry.get())
@@ -1368,12 +3763,14 @@ class MinecraftTextureEditor:
 
     def zoom_in(self):
         if self.zoom_factor < 32:
+            self.stop_playback()
             self.zoom_factor *= 2
             self.zoom_label.config(text=f"{int(self.zoom_factor * 100)}%")
             self.update_canvas()
 
     def zoom_out(self):
         if self.zoom_factor > 1:
+            self.stop_playback()
             self.zoom_factor //= 2
             self.zoom_label.config(text=f"{int(self.zoom_factor * 100)}%")
             self.update_canvas()
@@ -1386,59 +3783,464 @@ class MinecraftTextureEditor:
             self.root.after_cancel(self.update_canvas_id)
             self.update_canvas_id = None
 
+        if self.notebook.select() != str(self.editor_frame):
+            # Don't render into a hidden tab; refresh_editor_tab redraws when it is shown
+            self.canvas_stale = True
+            return
+        self.canvas_stale = False
+
+        self.last_canvas_update = time.perf_counter()
+        if self.image is None:
+            self.canvas.delete("all")
+            self.render_tiles, self.render_key = {}, None
+            self.refresh_tiling_preview()
+            self.refresh_mipmap_preview()
+            self.refresh_model_preview()
+            return
+
+        # Rebuild everything when the document, its size, the zoom or the grid
+        # changed; otherwise redraw only the tiles under the buffer's dirty boxes
+        render_key = (self.image, self.image.size, self.zoom_factor, self.show_grid, self.grid_size_x, self.grid_size_y, self.tint)
+        if render_key != self.render_key:
+            self.render_key = render_key
+            self.build_canvas()
+        else:
+            self.render_dirty_tiles()
+
+        width, height = self.image.size
+        if self.selection is not None and (self.selection[0][2] > width or self.selection[0][3] > height):
+            self.selection = None  # A smaller image was loaded
+        self.draw_selection()
+
+    def render_tile_step(self):
+        # Image pixels per tile side at the current zoom
+        return max(1, RENDER_TILE_SIZE // self.zoom_factor)
+
+    def render_region(self, box):
+        # Zoomed PIL view of one box of the buffer as displayed
+        region = self.display_pixels(box)
+        if self.zoom_factor > 1:
+            region = region.repeat(self.zoom_factor, axis=0).repeat(self.zoom_factor, axis=1)
+        return Image.fromarray(region, "RGBA")
+
+    def set_tint(self):
+        kind = self.tint_var.get()
+        if kind != "None" and find_colormap(kind.lower()) is None:
+            messagebox.showerror("Error", f"No colormap/{kind.lower()}.png found in the textures folder or the bundled texture zips.")
+            self.tint_var.set("None")
+            kind = "None"
+        self.tint = None if kind == "None" else (kind.lower(), self.biome_var.get())
+        self.update_canvas()
+
+    def tint_color(self, tint):
+        name, biome = tint
+        return colormap_color(find_colormap(name), *BIOMES[biome])
+
+    def display_pixels(self, box):
+        # Pixels of one box of the buffer as shown: the buffer itself, or its
+        # cached tinted copy for the current biome
+        left, top, right, bottom = box
+        if self.tint is None:
+            return self.image.pixels[top:bottom, left:right]
+        if self.image.mapped:
+            # Large canvases are tinted per tile rather than copied whole
+            return tint_pixels(self.image.pixels[top:bottom, left:right], self.tint_color(self.tint))
+        if self.tint_source is not self.image:
+            self.tint_cache, self.tint_source = {}, self.image
+        if self.tint in self.tint_cache:
+            self.tint_cache[self.tint] = self.tint_cache.pop(self.tint)  # Now the most recently used
+        else:
+            self.tint_cache[self.tint] = tint_pixels(self.image.pixels, self.tint_color(self.tint))
+            while len(self.tint_cache) > TINT_CACHE_SIZE:
+                del self.tint_cache[next(iter(self.tint_cache))]
+        return self.tint_cache[self.tint][top:bottom, left:right]
+
+    def take_dirty_boxes(self):
+        # The buffer's dirty boxes, after bringing every cached tint up to date with them
+        boxes = self.image.take_dirty()
+        if self.tint_source is self.image:
+            for tint, tinted in self.tint_cache.items():
+                for left, top, right, bottom in boxes:
+                    tinted[top:bottom, left:right] = tint_pixels(self.image.pixels[top:bottom, left:right], self.tint_color(tint))
+        self.refresh_tiling_preview(boxes)
+        self.refresh_mipmap_preview(boxes)
+        self.refresh_model_preview(boxes)
+        return boxes
+
+    def open_tiling_preview(self):
+        if self.tiling_window is not None:
+            self.tiling_window.lift()
+            return
+        self.tiling_window = tk.Toplevel(self.root)
+        self.tiling_window.title("Tiling Preview")
+        self.tiling_window.configure(bg="#1a1a1a")
+        self.tiling_window.protocol("WM_DELETE_WINDOW", self.close_tiling_preview)
+        controls = tk.Frame(self.tiling_window, bg="#1a1a1a")
+        controls.pack(side="top", fill="x")
+        tk.Label(controls, text="Copies:", bg="#1a1a1a", fg="white").pack(side="left", padx=5)
+        self.tiling_copies = tk.Spinbox(controls, from_=2, to=8, width=3, command=self.refresh_tiling_preview, bg="#3a3a3a", fg="white", insertbackground="white")
+        self.tiling_copies.delete(0, tk.END)
+        self.tiling_copies.insert(0, "3")
+        self.tiling_copies.bind("<Return>", lambda event: self.refresh_tiling_preview())
+        self.tiling_copies.pack(side="left", padx=5)
+        self.show_seams = tk.BooleanVar(value=True)
+        tk.Checkbutton(controls, text="Highlight seams", variable=self.show_seams, command=self.draw_seams, bg="#1a1a1a", fg="white",
+                       selectcolor="#3a3a3a", activebackground="#1a1a1a").pack(side="left", padx=5)
+        self.tiling_canvas = tk.Canvas(self.tiling_window, bg="#1a1a1a", highlightthickness=0)
+        self.tiling_canvas.pack(padx=10, pady=10)
+        self.tiling_key = None
+        self.refresh_tiling_preview()
+
+    def close_tiling_preview(self):
+        self.tiling_window.destroy()
+        self.tiling_window = self.tiling_key = self.tiling_pixels = self.tiling_photo = self.tiling_seams = None
+
+    def tiling_scale(self, copies):
+        # (zoom, sampling step) fitting copies x copies of the image in TILING_PREVIEW_SIZE
+        side = copies * max(self.image.size)
+        return max(1, TILING_PREVIEW_SIZE // side), max(1, -(-side // TILING_PREVIEW_SIZE))
+
+    def refresh_tiling_preview(self, boxes=None):
+        # Bring the tiling preview up to date: rebuilt when the image, tint or
+        # number of copies changed, otherwise only the given dirty boxes are redrawn
+        if self.tiling_window is None:
+            return
+        try:
+            copies = min(max(int(self.tiling_copies.get()), 2), 8)
+        except ValueError:
+            copies = 3
+        if self.image is None:
+            self.tiling_canvas.delete("all")
+            self.tiling_key = None
+            return
+        key = (self.image, self.image.size, self.tint, copies)
+        seams_changed = key != self.tiling_key
+        if key != self.tiling_key:
+            self.tiling_key = key
+            boxes = [(0, 0) + self.image.size]
+            self.tiling_seams = edge_seams(self.image.pixels)
+            zoom, step = self.tiling_scale(copies)
+            height, width = -(-self.image.height // step) * zoom, -(-self.image.width // step) * zoom
+            self.tiling_pixels = np.zeros((height, width, 4), np.uint8)
+            self.tiling_photo = ImageTk.PhotoImage("RGBA", (width, height))
+            self.tiling_canvas.delete("all")
+            self.tiling_canvas.config(width=width * copies, height=height * copies)
+            for row, column in itertools.product(range(copies), repeat=2):
+                self.tiling_canvas.create_image(column * width, row * height, anchor="nw", image=self.tiling_photo, tags="copy")
+        elif not boxes:
+            return
+        else:
+            # Seams are only rechecked where an edit reached the image's edges
+            for box in boxes:
+                seams_changed |= update_edge_seams(self.tiling_seams, self.image.pixels, box)
+        zoom, step = self.tiling_scale(copies)
+        for left, top, right, bottom in boxes:
+            # Pixels on the sampling grid inside the box, sampled before tinting
+            # so a large canvas is never tinted whole
+            left, top = -(-left // step), -(-top // step)
+            right, bottom = -(-right // step), -(-bottom // step)
+            if left >= right or top >= bottom:
+                continue
+            region = self.image.pixels[top * step:bottom * step:step, left * step:right * step:step]
+            if self.tint is not None:
+                region = tint_pixels(region, self.tint_color(self.tint))
+            if zoom > 1:
+                region = region.repeat(zoom, axis=0).repeat(zoom, axis=1)
+            self.tiling_pixels[top * zoom:bottom * zoom, left * zoom:right * zoom] = region
+        self.tiling_photo.paste(Image.fromarray(self.tiling_pixels, "RGBA"))
+        if seams_changed:
+            self.draw_seams()
+
+    def open_mipmap_preview(self):
+        if self.mipmap_window is not None:
+            self.mipmap_window.lift()
+            return
+        self.mipmap_window = tk.Toplevel(self.root)
+        self.mipmap_window.title("Mipmap Preview")
+        self.mipmap_window.configure(bg="#1a1a1a")
+        self.mipmap_window.protocol("WM_DELETE_WINDOW", self.close_mipmap_preview)
+        self.mipmap_canvas = tk.Canvas(self.mipmap_window, bg="#1a1a1a", highlightthickness=0)
+        self.mipmap_canvas.pack(padx=10, pady=10)
+        self.mipmap_key = None
+        self.refresh_mipmap_preview()
+
+    def close_mipmap_preview(self):
+        self.mipmap_window.destroy()
+        self.mipmap_window = self.mipmap_key = self.mipmap_chain = None
+        self.mipmap_photos = []
+
+    def refresh_mipmap_preview(self, boxes=None):
+        # Bring the mip chain up to date: rebuilt when the image or tint changed or
+        # an edit switched cutout blending on or off, otherwise only the blocks
+        # under the dirty boxes
+        if self.mipmap_window is None:
+            return
+        if self.image is None:
+            self.mipmap_canvas.delete("all")
+            self.mipmap_key = None
+            return
+        key = (self.image, self.image.size, self.tint)
+        if self.image.mapped:
+            # Canvases too large to hold in memory are far beyond any texture the game mipmaps
+            if key != self.mipmap_key:
+                self.mipmap_key = key
+                self.mipmap_chain, self.mipmap_photos = None, []
+                self.mipmap_canvas.delete("all")
+                self.mipmap_canvas.config(width=320, height=40)
+                self.mipmap_canvas.create_text(160, 20, text="This canvas is too large to preview mipmaps", fill="white")
+            return
+        pixels = self.image.pixels
+        rebuild = key != self.mipmap_key
+        if not rebuild:
+            if not boxes:
+                return
+            for left, top, right, bottom in boxes:
+                self.mipmap_clear_rows[top:bottom] = (pixels[top:bottom, :, 3] == 0).sum(axis=1)
+            rebuild = bool(self.mipmap_clear_rows.any()) != self.mipmap_transparent
+        if rebuild:
+            self.mipmap_key = key
+            self.mipmap_clear_rows = (pixels[..., 3] == 0).sum(axis=1)
+            self.mipmap_transparent = bool(self.mipmap_clear_rows.any())
+            self.mipmap_chain = mip_chain(pixels, transparent=self.mipmap_transparent)  # Level 0 is the buffer's own pixels
+            width, height = self.mipmap_size = self.mipmap_display_size()
+            self.mipmap_canvas.delete("all")
+            self.mipmap_canvas.config(width=len(self.mipmap_chain) * (width + 10) - 10, height=height + 20)
+            self.mipmap_photos = []
+            for level, pixels in enumerate(self.mipmap_chain):
+                photo = ImageTk.PhotoImage("RGBA", (width, height))
+                self.mipmap_canvas.create_image(level * (width + 10), 0, anchor="nw", image=photo)
+                self.mipmap_canvas.create_text(level * (width + 10) + width // 2, height + 10,
+                                               text=f"Level {level} ({pixels.shape[1]}x{pixels.shape[0]})", fill="white")
+                self.mipmap_photos.append(photo)
+        else:
+            for box in boxes:
+                update_mip_chain(self.mipmap_chain, box, self.mipmap_transparent)
+        for pixels, photo in zip(self.mipmap_chain, self.mipmap_photos):
+            if self.tint is not None:
+                pixels = tint_pixels(pixels, self.tint_color(self.tint))
+            photo.paste(Image.fromarray(np.ascontiguousarray(pixels), "RGBA").resize(self.mipmap_size, Image.NEAREST))
+
+    def open_model_preview(self):
+        if self.model_window is not None:
+            self.model_window.lift()
+            return
+        self.model_window = tk.Toplevel(self.root)
+        self.model_window.title("3D Preview")
+        self.model_window.configure(bg="#1a1a1a")
+        self.model_window.protocol("WM_DELETE_WINDOW", self.close_model_preview)
+        controls = tk.Frame(self.model_window, bg="#1a1a1a")
+        controls.pack(side="top", fill="x")
+        self.model_mode = tk.StringVar(value="Block")
+        for mode in ("Block", "Item"):
+            tk.Radiobutton(controls, text=mode, variable=self.model_mode, value=mode, command=self.refresh_model_preview, bg="#1a1a1a", fg="white",
+                           selectcolor="#3a3a3a", activebackground="#1a1a1a").pack(side="left", padx=5)
+        self.model_photo = ImageTk.PhotoImage("RGBA", (PREVIEW_3D_SIZE, PREVIEW_3D_SIZE))
+        self.model_canvas = tk.Canvas(self.model_window, bg="#1a1a1a", highlightthickness=0, width=PREVIEW_3D_SIZE, height=PREVIEW_3D_SIZE)
+        self.model_canvas.pack(padx=10, pady=10)
+        self.model_canvas.create_image(0, 0, anchor="nw", image=self.model_photo)
+        self.model_key = None
+        self.refresh_model_preview()
+
+    def close_model_preview(self):
+        self.model_window.destroy()
+        self.model_window = self.model_key = self.model_photo = None
+
+    def refresh_model_preview(self, boxes=None):
+        # Redraw the 3D preview when the texture changed (dirty boxes) or the
+        # image, tint or mode did; each redraw is one gather through cached maps
+        if self.model_window is None:
+            return
+        key = (self.image, self.image.size if self.image else None, self.tint, self.model_mode.get())
+        if key == self.model_key and not boxes:
+            return
+        self.model_key = key
+        if self.image is None:
+            self.model_photo.paste(Image.new("RGBA", (PREVIEW_3D_SIZE, PREVIEW_3D_SIZE)))
+            return
+        render = render_cube if self.model_mode.get() == "Block" else render_item
+        pixels = render(self.image.pixels)
+        if self.tint is not None:
+            pixels = tint_pixels(pixels, self.tint_color(self.tint))
+        self.model_photo.paste(Image.fromarray(pixels, "RGBA"))
+
+    def mipmap_display_size(self):
+        # Every level is drawn at the same size, as the game shows them at growing distance
+        width, height = self.image.size
+        scale = MIPMAP_PREVIEW_SIZE / max(width, height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def draw_seams(self):
+        # Red marks along the edges where neighbouring copies don't match
+        if self.tiling_window is None or self.tiling_key is None:
+            return
+        self.tiling_canvas.delete("seam")
+        if not self.show_seams.get():
+            return
+        copies = self.tiling_key[3]
+        zoom, step = self.tiling_scale(copies)
+        height, width = self.tiling_pixels.shape[:2]
+        rows, columns = self.tiling_seams
+        scale = zoom / step
+        for copy in range(1, copies):
+            for start, end in mask_runs(rows):
+                for row in range(copies):
+                    self.tiling_canvas.create_line(copy * width, row * height + start * scale, copy * width, row * height + end * scale,
+                                                   fill="#FF3030", width=2, tags="seam")
+            for start, end in mask_runs(columns):
+                for column in range(copies):
+                    self.tiling_canvas.create_line(column * width + start * scale, copy * height, column * width + end * scale, copy * height,
+                                                   fill="#FF3030", width=2, tags="seam")
+
+    def build_canvas(self):
         self.canvas.delete("all")
-        if self.image:
-            width, height = self.image.size
-            scaled_width = int(width * self.zoom_factor)
-            scaled_height = int(height * self.zoom_factor)
-            resized_image = self.image.resize((scaled_width, scaled_height), Image.NEAREST)
-            self.tk_image = ImageTk.PhotoImage(resized_image)
-            self.canvas.config(width=scaled_width, height=scaled_height)
-            self.canvas.create_image(0, 0, anchor="nw", image=self.tk_image)
-
-            if self.show_grid:
-                for x in range(0, scaled_width, self.grid_size_x * self.zoom_factor):
-                    self.canvas.create_line(x, 0, x, scaled_height, fill="#FFFFFF", stipple="gray50")
-                for y in range(0, scaled_height, self.grid_size_y * self.zoom_factor):
-                    self.canvas.create_line(0, y, scaled_width, y, fill="#FFFFFF", stipple="gray50")
+        self.take_dirty_boxes()
+        self.render_tiles = {}
+        self.fit_canvas_view()
+        self.realize_visible_tiles()
+
+    def fit_canvas_view(self, event=None):
+        # The canvas is as big as the zoomed image up to the space available and
+        # scrolls beyond that
+        if self.image is None:
+            return
+        scaled_width, scaled_height = self.image.width * self.zoom_factor, self.image.height * self.zoom_factor
+        frame_width, frame_height = self.canvas_frame.winfo_width(), self.canvas_frame.winfo_height()
+        if frame_width <= 1:  # Not laid out yet
+            frame_width, frame_height = 1000, 750
+        self.canvas.config(width=min(scaled_width, max(frame_width - 20, 100)), height=min(scaled_height, max(frame_height - 50, 100)),
+                           scrollregion=(0, 0, scaled_width, scaled_height))
+
+    def visible_box(self):
+        # Box of image pixels in view
+        zoom = self.zoom_factor
+        view_width = self.canvas.winfo_width() if self.canvas.winfo_ismapped() else int(self.canvas["width"])
+        view_height = self.canvas.winfo_height() if self.canvas.winfo_ismapped() else int(self.canvas["height"])
+        left, top = int(self.canvas.canvasx(0)), int(self.canvas.canvasy(0))
+        return (max(left // zoom, 0), max(top // zoom, 0),
+                min(-(-(left + view_width) // zoom), self.image.width), min(-(-(top + view_height) // zoom), self.image.height))
+
+    def realize_visible_tiles(self, event=None):
+        # Create PhotoImage tiles for the part of the image in view and drop the
+        # ones scrolled out of it; the grid is drawn over the view only
+        if self.image is None or self.render_key is None:
+            return
+        width, height = self.image.size
+        zoom = self.zoom_factor
+        step = self.render_tile_step()
+        view = self.visible_box()
+        if view[0] >= view[2] or view[1] >= view[3]:
+            return
+        visible = set(tile_range(view, step))
+        for tile in list(self.render_tiles):
+            if tile not in visible:
+                self.canvas.delete(self.render_tiles.pop(tile)[2])
+        for column, row in visible - self.render_tiles.keys():
+            box = (column * step, row * step, min((column + 1) * step, width), min((row + 1) * step, height))
+            photo = ImageTk.PhotoImage(self.render_region(box))
+            item = self.canvas.create_image(box[0] * zoom, box[1] * zoom, anchor="nw", image=photo, tags="tile")
+            self.render_tiles[column, row] = (box, photo, item)
+        self.canvas.tag_lower("tile")
+
+        self.canvas.delete("grid")
+        if self.show_grid:
+            left, top, right, bottom = (v * zoom for v in view)
+            grid_x, grid_y = self.grid_size_x * zoom, self.grid_size_y * zoom
+            for x in range(-(-left // grid_x) * grid_x, right, grid_x):
+                self.canvas.create_line(x, top, x, bottom, fill="#FFFFFF", stipple="gray50", tags="grid")
+            for y in range(-(-top // grid_y) * grid_y, bottom, grid_y):
+                self.canvas.create_line(left, y, right, y, fill="#FFFFFF", stipple="gray50", tags="grid")
+
+    def render_dirty_tiles(self):
+        tiles = set()
+        for box in self.take_dirty_boxes():
+            tiles.update(tile_range(box, self.render_tile_step()))
+        for tile in tiles & self.render_tiles.keys():
+            box, photo, item = self.render_tiles[tile]
+            photo.paste(self.render_region(box))
+
+    def on_canvas_scroll(self, event):
+        # Mouse wheel scrolls vertically, Shift+wheel horizontally
+        units = -1 if event.num == 4 or event.delta > 0 else 1
+        if event.state & 0x1:
+            self.canvas.xview_scroll(units, "units")
+        else:
+            self.canvas.yview_scroll(units, "units")
+        self.realize_visible_tiles()
+
+    def on_canvas_pan(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.realize_visible_tiles()
+
+    def schedule_canvas_update(self):
+        # Coalesce redraws requested by motion events: at most one per display frame
+        if self.update_canvas_id is not None:
+            return
+        delay = int(FRAME_INTERVAL_MS - (time.perf_counter() - self.last_canvas_update) * 1000)
+        if delay > 0:
+            self.update_canvas_id = self.root.after(delay, self.update_canvas)
+        else:
+            self.update_canvas_id = self.root.after_idle(self.update_canvas)
 
     def on_mouse_down(self, event):
         if not self.image:
             return
+        self.stop_playback()
+        if self.current_tool == "bucket":
+            self.paint_bucket(event)
+            return
+        if self.current_tool in SELECTION_TOOLS:
+            self.selection_mouse_down(event)
+            return
         self.is_drawing = True
-        self.last_action = self.image.copy()
+        self.image.begin_capture()
+        self.last_stroke_point = None
+        self.stroke_box = None
+        self.stroke_mask = {} if self.brush_mode == "Blend" else None
         self.edit_pixel(event)
 
     def on_mouse_drag(self, event):
-        if not self.image or not self.is_drawing:
+        if not self.image:
+            return
+        if self.current_tool in SELECTION_TOOLS:
+            self.selection_mouse_drag(event)
+            return
+        if not self.is_drawing:
             return
         self.edit_pixel(event)
 
     def on_mouse_up(self, event):
         if not self.image:
             return
+        if self.current_tool in SELECTION_TOOLS:
+            self.selection_mouse_up(event)
+            return
         self.is_drawing = False
-        if self.last_action:
-            self.undo_stack.append(self.image.copy())
-self.redo_stack = []
-self.update_undo_redo_buttons()
-self.last_action = None
-
-def edit_pixel(self, event):
+        self.last_stroke_point = None
+        self.stroke_mask = None
+        if self.image.captured is not None and self.stroke_box:
+            self.push_history(self.stroke_box, self.image.end_capture(self.stroke_box))
+        self.image.captured = None
+        self.stroke_box = None
+
+    def edit_pixel(self, event):
         if not self.image:
             return
-        x = int(event.x // self.zoom_factor)
-        y = int(event.y // self.zoom_factor)
+        x, y = self.canvas_to_pixel(event)
+
+        if self.current_tool in ("paint", "erase"):
+            # Stamp the brush along the segment since the previous motion event so fast
+            # strokes stay continuous; segments leaving the image are clipped
+            start = self.last_stroke_point or (x, y)
+            self.last_stroke_point = (x, y)
+            self.paint_segment(start, (x, y))
+            self.schedule_canvas_update()
+            return
+
         if not (0 <= x < self.image.width and 0 <= y < self.image.height):
             return
 
-        pixels = self.image.load()
-        if self.current_tool == "paint":
-            pixels[x, y] = self.current_color
-        elif self.current_tool == "erase":
-            pixels[x, y] = (0, 0, 0, 0)
-        elif self.current_tool == "eyedropper":
-            r, g, b, a = pixels[x, y]
+        if self.current_tool == "eyedropper":
+            r, g, b, a = (int(v) for v in self.image.pixels[y, x])
             self.current_color = (r, g, b, a)
             self.hex_entry.delete(0, tk.END)
             self.hex_entry.insert(0, f"#{r:02x}{g:02x}{b:02x}")
@@ -1448,56 +4250,234 @@ def edit_pixel(self, event):
 
         self.update_canvas()
 
-def paint_bucket(self, event):
+    def paint_segment(self, start, end):
+        left, top, footprint = stamp_segment(start, end, brush_mask(self.brush_shape, self.brush_size))
+        x0, y0 = max(left, 0), max(top, 0)
+        x1 = min(left + footprint.shape[1], self.image.width)
+        y1 = min(top + footprint.shape[0], self.image.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        # Everything below is a vectorized write over the bounding box of the segment
+        footprint = footprint[y0 - top:y1 - top, x0 - left:x1 - left]
+        threshold = BRUSH_DITHERS[self.brush_dither]
+        if threshold < 16:
+            rows, cols = np.ogrid[y0:y1, x0:x1]
+            footprint &= np.asarray(_BAYER_4)[rows % 4, cols % 4] < threshold
+        self.image.capture((x0, y0, x1, y1))
+        region = self.image.pixels[y0:y1, x0:x1]  # Written in place
+        if self.current_tool == "erase":
+            region[footprint] = 0
+        elif self.brush_mode == "Blend":
+            # Blend each pixel once per stroke so overlapping stamps don't build up
+            if self.stroke_mask is not None:
+                claim_pixels(self.stroke_mask, (x0, y0, x1, y1), footprint)
+            region[footprint] = blend_over(region[footprint], self.current_color)
+        else:
+            region[footprint] = self.current_color
+        self.image.mark_dirty((x0, y0, x1, y1))
+        self.stroke_box = union_box(self.stroke_box, (x0, y0, x1, y1))
+
+    def canvas_to_pixel(self, event):
+        # The canvas scrolls, so window coordinates are offset by the view
+        return int(self.canvas.canvasx(event.x) // self.zoom_factor), int(self.canvas.canvasy(event.y) // self.zoom_factor)
+
+    def selection_mouse_down(self, event):
+        x, y = self.canvas_to_pixel(event)
+        if self.current_tool == "wand":
+            if 0 <= x < self.image.width and 0 <= y < self.image.height:
+                self.selection = selection_from_mask(magic_wand_mask(self.image.pixels, x, y))
+            else:
+                self.selection = None
+            self.draw_selection()
+        elif self.current_tool == "select" or self.selection is not None:
+            self.selection_start = (x, y)
+            self.selection_offset = (0, 0)
+
+    def selection_mouse_drag(self, event):
+        if self.selection_start is None:
+            return
+        x, y = self.canvas_to_pixel(event)
+        x0, y0 = self.selection_start
+        if self.current_tool == "move":
+            self.selection_offset = (x - x0, y - y0)
+            self.draw_selection()
+        else:
+            self.draw_selection((min(x0, x), min(y0, y), max(x0, x) + 1, max(y0, y) + 1))
+
+    def selection_mouse_up(self, event):
+        if self.selection_start is None:
+            return
+        x, y = self.canvas_to_pixel(event)
+        x0, y0 = self.selection_start
+        self.selection_start = None
+        if self.current_tool == "move":
+            self.selection_offset = (0, 0)
+            if (x, y) != (x0, y0):
+                self.transform_selection(None, offset=(x - x0, y - y0))
+            else:
+                self.draw_selection()
+            return
+
+        width, height = self.image.size
+        left, top = max(min(x0, x), 0), max(min(y0, y), 0)
+        right, bottom = min(max(x0, x) + 1, width), min(max(y0, y) + 1, height)
+        if left < right and top < bottom:
+            self.selection = (left, top, right, bottom), np.ones((bottom - top, right - left), dtype=bool)
+        else:
+            self.selection = None
+        self.draw_selection()
+
+    def draw_selection(self, box=None):
+        # Outline the selection's bounding box, or an in-progress rectangle, on the canvas
+        self.canvas.delete("selection")
+        if box is None and self.selection is not None:
+            box = self.selection[0]
+            dx, dy = self.selection_offset
+            box = (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+        if box is None:
+            return
+        z = self.zoom_factor
+        self.canvas.create_rectangle(box[0] * z, box[1] * z, box[2] * z, box[3] * z, outline="white", dash=(4, 4), tags="selection")
+
+    def clear_selection(self):
+        self.selection = None
+        self.selection_start = None
+        if hasattr(self, 'canvas') and self.canvas.winfo_exists():
+            self.draw_selection()
+
+    def selected_box(self):
+        box = self.selection[0] if self.image and self.selection is not None else None
+        if box is None:
+            messagebox.showerror("Error", "Select a region first.")
+        return box
+
+    def transform_selection(self, transform, offset=(0, 0)):
+        # Lift the selected pixels, transform pixels and mask with one array operation
+        # and drop them back centred on their old box (shifted by offset)
+        box = self.selected_box()
+        if box is None:
+            return
+        left, top, right, bottom = box
+        mask = self.selection[1]
+        pixels = np.where(mask[..., None], self.image.crop(box), 0).astype(np.uint8)
+        if transform is not None:
+            mask, pixels = transform(mask), transform(pixels)
+        height, width = mask.shape
+        dest = (left + (right - left - width) // 2 + offset[0], top + (bottom - top - height) // 2 + offset[1])
+        self.place_pixels(dest, pixels, mask, clear=box)
+
+    def place_pixels(self, dest, pixels, mask, clear=None):
+        # Write the masked pixels with their top-left corner at dest, after clearing the
+        # selected pixels inside the clear box, as one history entry covering both boxes.
+        # The placed pixels become the new selection.
+        width, height = self.image.size
+        dest_box = (dest[0], dest[1], dest[0] + mask.shape[1], dest[1] + mask.shape[0])
+        affected = union_box(clear, dest_box)
+        affected = (max(affected[0], 0), max(affected[1], 0), min(affected[2], width), min(affected[3], height))
+        if affected[0] >= affected[2] or affected[1] >= affected[3]:
+            return
+        left, top = affected[:2]
+        before = self.image.crop(affected)
+        region = before.copy()
+        if clear is not None:
+            cl, ct, cr, cb = clear
+            region[ct - top:cb - top, cl - left:cr - left][self.selection[1]] = 0
+
+        selection = None
+        dl, dt = max(dest_box[0], 0), max(dest_box[1], 0)
+        dr, db = min(dest_box[2], width), min(dest_box[3], height)
+        if dl < dr and dt < db:
+            src = (slice(dt - dest[1], db - dest[1]), slice(dl - dest[0], dr - dest[0]))
+            placed = mask[src]
+            region[dt - top:db - top, dl - left:dr - left][placed] = pixels[src][placed]
+            selection = selection_from_mask(placed, (dl, dt))
+        self.image.paste(region, (left, top))
+        self.push_history(affected, before)
+        self.selection = selection
+        self.update_canvas()
+
+    def copy_selection(self):
+        box = self.selected_box()
+        if box is None:
+            return
+        mask = self.selection[1].copy()
+        pixels = np.where(mask[..., None], self.image.crop(box), 0).astype(np.uint8)
+        self.clipboard = (pixels, mask, box[:2])
+
+    def paste_clipboard(self):
+        if not self.image or self.clipboard is None:
+            return
+        pixels, mask, origin = self.clipboard
+        self.place_pixels(origin, pixels, mask)
+
+    def hue_shift_selection(self):
+        try:
+            self.hue_shift = int(self.hue_shift_spinbox.get())
+        except ValueError:
+            messagebox.showerror("Error", "Hue shift must be an integer number of degrees.")
+            return
+        box = self.selected_box()
+        if box is None or self.hue_shift % 360 == 0:
+            return
+        before = self.image.crop(box)
+        region = before.copy()
+        mask = self.selection[1]
+        region[..., :3][mask] = shift_hue(before[..., :3][mask], self.hue_shift)
+        self.image.paste(region, box[:2])
+        self.push_history(box, before)
+        self.update_canvas()
+
+    def paint_bucket(self, event):
         if not self.image:
             print("Paint Bucket: No image loaded.")
             return
-        x = int(event.x // self.zoom_factor)
-        y = int(event.y // self.zoom_factor)
+        x, y = self.canvas_to_pixel(event)
         if not (0 <= x < self.image.width and 0 <= y < self.image.height):
             print(f"Paint Bucket: Click outside image bounds (x={x}, y={y}, width={self.image.width}, height={self.image.height}).")
             return
 
         print(f"Paint Bucket: Starting at position (x={x}, y={y}) with color {self.current_color}")
+        width, height = self.image.size
+        # On large canvases history keeps only the tiles that weren't blank
+        before = self.image.snapshot((0, 0, width, height))
         try:
-            self.paint_bucket_animation(x, y)
+            self.paint_bucket_animation(x, y, before)
         except Exception as e:
             print(f"Paint Bucket: Error in paint_bucket: {str(e)}")
             # Fallback: Fill the image immediately if animation fails
-            pixels = self.image.load()
-            width, height = self.image.size
-            for px in range(width):
-                for py in range(height):
-                    pixels[px, py] = self.current_color
-            self.undo_stack.append(self.image.copy())
-            self.redo_stack = []
-            self.update_undo_redo_buttons()
+            self.complete_fill(before)
             self.update_canvas()
             print("Paint Bucket: Fallback fill completed.")
 
-def paint_bucket_animation(self, x, y):
+    def complete_fill(self, before):
+        # Fill the whole image with the current color as one history entry; on large
+        # canvases the entry's "after" is just the color, not a copy of the canvas
+        width, height = self.image.size
+        self.image.pixels[:] = self.current_color
+        self.image.mark_dirty((0, 0, width, height))
+        filled = TiledPixels((0, 0, width, height), {}, self.current_color) if self.image.mapped else None
+        self.push_history((0, 0, width, height), before, filled)
+
+    def paint_bucket_animation(self, x, y, before):
         """Simulate a 'ball of paint' spreading effect and fill the entire image."""
+        pixels = self.image.pixels
+        width, height = self.image.size
         try:
-            pixels = self.image.load()
-            width, height = self.image.size
-            filled_pixels = [(px, py) for px in range(width) for py in range(height)]  # All pixels in the image
-            print(f"Paint Bucket Animation: Total pixels to fill: {len(filled_pixels)}")
+            total_pixels = width * height  # All pixels in the image, filled column by column
+            print(f"Paint Bucket Animation: Total pixels to fill: {total_pixels}")
 
             # Animation parameters
             max_radius = max(width, height)  # Base radius on image dimensions (not scaled)
             steps = 20  # Number of animation frames
-            pixels_per_step = max(1, len(filled_pixels) // steps)
+            pixels_per_step = max(1, total_pixels // steps)
             print(f"Paint Bucket Animation: Steps={steps}, Pixels per step={pixels_per_step}")
 
             def animate_fill(step=0):
                 try:
                     if step >= steps:
                         # Final fill of all pixels
-                        for px, py in filled_pixels:
-                            pixels[px, py] = self.current_color
-                        self.undo_stack.append(self.image.copy())
-                        self.redo_stack = []
-                        self.update_undo_redo_buttons()
+                        self.complete_fill(before)
                         self.canvas.delete("animation")
                         self.update_canvas()
                         print("Paint Bucket Animation: Completed successfully.")
@@ -1522,10 +4502,11 @@ def paint_bucket_animation(self, x, y):
 
                     # Fill a portion of the pixels
                     start_idx = step * pixels_per_step
-                    end_idx = min((step + 1) * pixels_per_step, len(filled_pixels))
-                    for idx in range(start_idx, end_idx):
-                        px, py = filled_pixels[idx]
-                        pixels[px, py] = self.current_color
+                    end_idx = min((step + 1) * pixels_per_step, total_pixels)
+                    if start_idx < end_idx:
+                        px, py = np.unravel_index(np.arange(start_idx, end_idx), (width, height))
+                        pixels[py, px] = self.current_color
+                        self.image.mark_dirty((int(px[0]), 0, int(px[-1]) + 1, height))
                     print(f"Paint Bucket Animation: Filled pixels {start_idx} to {end_idx}")
 
                     # Force canvas update
@@ -1537,11 +4518,7 @@ def paint_bucket_animation(self, x, y):
                 except Exception as e:
                     print(f"Paint Bucket Animation: Error at step {step}: {str(e)}")
                     # Fallback: Complete the fill immediately
-                    for px, py in filled_pixels:
-                        pixels[px, py] = self.current_color
-                    self.undo_stack.append(self.image.copy())
-                    self.redo_stack = []
-                    self.update_undo_redo_buttons()
+                    self.complete_fill(before)
                     self.canvas.delete("animation")
                     self.update_canvas()
                     print("Paint Bucket Animation: Fallback fill completed due to error.")
@@ -1550,16 +4527,148 @@ def paint_bucket_animation(self, x, y):
         except Exception as e:
             print(f"Paint Bucket Animation: Initialization error: {str(e)}")
             # Fallback: Fill the image immediately
-            for px in range(width):
-                for py in range(height):
-                    pixels[px, py] = self.current_color
-            self.undo_stack.append(self.image.copy())
-            self.redo_stack = []
-            self.update_undo_redo_buttons()
+            self.complete_fill(before)
             self.update_canvas()
             print("Paint Bucket Animation: Fallback fill completed during initialization.")
 
-if __name__ == "__main__":
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Minecraft Texture Editor")
+    parser.add_argument("--profile-startup", action="store_true", help="Print per-phase startup timings once the window is drawn, then exit")
+    commands = parser.add_subparsers(dest="command")
+
+    sheets = commands.add_parser("contact-sheet", help="Render every pattern x texture combination into labelled contact sheets")
+    sheets.add_argument("textures", nargs="+", help="PNG files or directories of PNG files")
+    sheets.add_argument("-o", "--output", default="contact_sheets", help="Output directory")
+    sheets.add_argument("-n", "--count", type=int, default=2, choices=range(2, 11), help="Images per combination")
+    sheets.add_argument("-p", "--pattern", action="append", help="Built-in pattern name (repeatable, default: all)")
+    sheets.add_argument("-f", "--formula", action="append", default=[], help="Custom pattern as NAME=FORMULA (repeatable)")
+    sheets.add_argument("--size", type=int, default=16, help="Combined image size in pixels")
+    sheets.add_argument("--scale", type=int, default=4, help="Zoom of each cell on the sheet")
+    sheets.add_argument("--columns", type=int, default=16)
+    sheets.add_argument("--rows", type=int, default=16)
+    sheets.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    optimize = commands.add_parser("optimize", help="Losslessly shrink PNG files")
+    optimize.add_argument("textures", nargs="+", help="PNG files or directories of PNG files")
+    optimize.add_argument("-o", "--output", help="Write optimized copies into this directory instead of replacing the files")
+    optimize.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    duplicates = commands.add_parser("duplicates", help="List clusters of duplicate and near-duplicate textures in the textures folder and version zips")
+    duplicates.add_argument("-d", "--distance", type=int, default=0, help="Largest perceptual hash distance within a cluster (0: identical looking)")
+    duplicates.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    similar = commands.add_parser("similar", help="List indexed textures that look like an image")
+    similar.add_argument("image")
+    similar.add_argument("-d", "--distance", type=int, default=SIMILAR_DISTANCE, help="Largest perceptual hash distance listed")
+    similar.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    palette = commands.add_parser("palette", help="Extract the combined palette of textures as an editable color mapping")
+    palette.add_argument("textures", nargs="+", help="PNG files or directories of PNG files")
+    palette.add_argument("-o", "--output", default="palette.json", help="JSON mapping of every color to itself, most used first")
+    palette.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    recolor = commands.add_parser("recolor", help="Swap colors of textures using a palette mapping")
+    recolor.add_argument("mapping", help="JSON object mapping '#rrggbb[aa]' colors to their replacements, e.g. an edited palette.json")
+    recolor.add_argument("textures", nargs="+", help="PNG files or directories of PNG files")
+    recolor.add_argument("-o", "--output", help="Write recolored copies into this directory instead of replacing the files")
+    recolor.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    upscale = commands.add_parser("upscale", help="Write a resource pack of textures scaled up 2x, 4x or 8x")
+    upscale.add_argument("textures", nargs="+", help="PNG files, directories of PNG files or version zips such as '1.21.5 Textures.zip'")
+    upscale.add_argument("-o", "--output", default="upscaled_pack.zip", help="Output zip")
+    upscale.add_argument("-f", "--factor", type=int, choices=(2, 4, 8), default=4)
+    upscale.add_argument("-m", "--method", choices=sorted(UPSCALERS), default="scale2x")
+    upscale.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    pack = commands.add_parser("pack", help="Write textures into a resource pack zip")
+    pack.add_argument("textures", nargs="+", help="PNG files or directories of PNG files, laid out as in '<version> Textures' or assets/minecraft/textures")
+    pack.add_argument("-o", "--output", default="resource_pack.zip", help="Output zip")
+    pack.add_argument("--description", default="Made with Minecraft Texture Editor")
+    pack.add_argument("--pack-format", type=int, default=PACK_FORMAT)
+    pack.add_argument("--against", metavar="ZIP", help="Only write textures that differ from this vanilla texture zip, e.g. '1.21.5 Textures.zip'")
+    pack.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+
+    args = parser.parse_args(argv)
+    if args.command == "contact-sheet":
+        available = builtin_patterns(args.count)
+        unknown = [name for name in args.pattern or [] if name not in available]
+        if unknown:
+            parser.error(f"Unknown pattern {unknown[0]!r}; available: {', '.join(available)}")
+        if args.pattern:
+            patterns = {name: available[name] for name in args.pattern}
+        else:
+            # Custom formulas alone replace the built-in set
+            patterns = {} if args.formula else dict(available)
+        for custom in args.formula:
+            name, sep, formula = custom.partition("=")
+            if not sep:
+                parser.error(f"--formula must be NAME=FORMULA, got {custom!r}")
+            patterns[name.strip()] = formula.strip()
+        try:
+            generate_contact_sheets(
+                expand_texture_paths(args.textures), args.output, count=args.count, patterns=patterns,
+                size=args.size, scale=args.scale, columns=args.columns, rows=args.rows, workers=args.workers,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        return
+    if args.command == "optimize":
+        before, after = optimize_pngs(expand_texture_paths(args.textures), args.output, args.workers)
+        print(f"Total: {before} -> {after} bytes")
+        return
+    if args.command == "duplicates":
+        clusters = texture_hash_index(args.workers).clusters(args.distance)
+        for number, cluster in enumerate(clusters, 1):
+            print(f"Cluster {number} ({len(cluster)} textures):")
+            for key in cluster:
+                print(f"  {key}")
+        print(f"{len(clusters)} clusters")
+        return
+    if args.command == "similar":
+        for distance, key in texture_hash_index(args.workers).query(texture_hash(args.image), args.distance):
+            print(f"{distance:3d}  {key}")
+        return
+    if args.command == "palette":
+        colors = extract_palette(expand_texture_paths(args.textures), args.workers)
+        with open(args.output, "w") as f:
+            json.dump({color_to_hex(color): color_to_hex(color) for color, _ in colors}, f, indent=2)
+        for color, count in colors[:16]:
+            print(f"{color_to_hex(color)}  {count} px")
+        print(f"Wrote {len(colors)} colors to {args.output}")
+        return
+    if args.command == "recolor":
+        try:
+            with open(args.mapping) as f:
+                mapping = {hex_to_color(source): hex_to_color(target) for source, target in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            parser.error(f"Invalid palette mapping: {e}")
+        count = swap_palettes(expand_texture_paths(args.textures), mapping, args.output, args.workers)
+        print(f"Recolored {count} textures")
+        return
+    if args.command == "upscale":
+        count = upscale_pack(args.textures, args.output, args.factor, args.method, args.workers)
+        print(f"Wrote {count} textures to {args.output}")
+        return
+    if args.command == "pack":
+        textures = ((pack_texture_path(path), path) for path in expand_texture_paths(args.textures))
+        vanilla = vanilla_index(args.against, args.workers) if args.against else None
+        count = export_resource_pack(textures, args.output, args.description, args.pack_format, args.workers, vanilla)
+        print(f"Wrote {count} {'changed ' if vanilla else ''}textures to {args.output}")
+        return
+
     root = TkinterDnD.Tk()
+    mark_startup("tk root")
     app = MinecraftTextureEditor(root)
-    root.mainloop()
\ No newline at end of file
+    if args.profile_startup:
+        root.update()
+        mark_startup("first frame")
+        lines, within_budget = startup_report()
+        print("\n".join(lines))
+        root.destroy()
+        sys.exit(0 if within_budget else 1)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import os
+import sys
+import types
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MinecraftTextureEditor as mte
+
+
+class Button:
+    def config(self, **options):
+        pass
+
+
+def make_editor(pixels, selection_box, shift):
+    # Only the state hue_shift_selection and push_history touch; no Tk window is created
+    editor = object.__new__(mte.MinecraftTextureEditor)
+    editor.image = mte.PixelBuffer(pixels)
+    left, top, right, bottom = selection_box
+    editor.selection = selection_box, np.ones((bottom - top, right - left), dtype=bool)
+    editor.hue_shift_spinbox = types.SimpleNamespace(get=lambda: str(shift))
+    editor.undo_stack, editor.redo_stack = [], []
+    editor.undo_btn = editor.redo_btn = Button()
+    editor.animation = None
+    editor.frame_cache = {}
+    editor.active_document = None
+    editor.update_canvas = lambda: None
+    return editor
+
+
+def test_hue_shift_selection_changes_only_the_selection():
+    pixels = np.zeros((8, 8, 4), dtype=np.uint8)
+    pixels[...] = (255, 0, 0, 255)
+    editor = make_editor(pixels.copy(), (2, 3, 6, 5), 120)
+
+    editor.hue_shift_selection()
+
+    result = editor.image.pixels
+    assert (result[3:5, 2:6] == (0, 255, 0, 255)).all()
+    outside = np.ones((8, 8), dtype=bool)
+    outside[3:5, 2:6] = False
+    assert (result[outside] == (255, 0, 0, 255)).all()
+    assert len(editor.undo_stack) == 1
+    box, before, after = editor.undo_stack[0]
+    assert box == (2, 3, 6, 5)
+    assert (before == (255, 0, 0, 255)).all()
+
+
+def test_full_turn_hue_shift_is_a_no_op():
+    pixels = np.random.default_rng(0).integers(0, 256, (8, 8, 4), dtype=np.uint8)
+    editor = make_editor(pixels.copy(), (0, 0, 8, 8), 360)
+
+    editor.hue_shift_selection()
+
+    assert np.array_equal(editor.image.pixels, pixels)
+    assert editor.undo_stack == []
+
+
+def test_shift_hue_round_trips_exactly():
+    rgb = np.random.default_rng(1).integers(0, 256, (1000, 3), dtype=np.uint8)
+    assert np.array_equal(mte.shift_hue(rgb, 0), rgb)
+    assert np.array_equal(mte.shift_hue(mte.shift_hue(rgb, 120), -120), rgb)